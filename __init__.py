@@ -1,109 +1,235 @@
 import time
-import MetaTrader5 as mt5
-import pandas as pd
-from zones import find_zones
-from execute_trades import open_sell_positions, open_buy_positions
-from mock_execute_trades import mock_open_sell_positions, mock_open_buy_positions
-
-MODE = 'live'
-
-def main():
-    if not mt5.initialize():
-        print("initialize() failed")
-        mt5.shutdown()
+_STARTED = time.perf_counter()  # Startup is measured from the first line of the entry point
+import argparse
+import contextlib
+import os
+from datetime import datetime
+import numpy as np
+from bar_cache import BarCache, timeframe_seconds, parse_timeframe
+from zones import ZoneTracker, SUPPLY, DEMAND
+from indicators import IndicatorRegistry
+from execute_trades import evaluate_and_trade, new_zone_index, new_confluence, zone_entry, LOOKBACK_DAYS
+from broker import LiveBroker, SimulatedBroker, TickReplayBroker, RecordingBroker, InstrumentedBroker
+from metrics import METRICS
+from risk import RiskEngine
+from config import load_config
+
+def run_cycle(mt5, symbol, timeframe, cache, tracker, indicators=None, confluence=None, risk=None):
+    """
+    One pass of the live loop: refresh bars, update zones (and the higher-timeframe zones
+    resampled from the same bars) and evaluate both sides.
+    Returns False if no bars could be fetched.
+    """
+    started = time.perf_counter_ns()
+    with METRICS.timer("cycle.refresh"):
+        refreshed = cache.refresh(symbol, timeframe)
+    if refreshed is None:
+        return False
+
+    rates = cache.bars(symbol, timeframe)
+    with METRICS.timer("cycle.zones"):
+        if not tracker.covers(rates):
+            # First run or a gap in the data - rebuild zones from the whole cached window
+            tracker.seed(rates)
+        elif tracker.update(rates):
+            print(f"New bar closed - {len(tracker.supply_zones)} supply / {len(tracker.demand_zones)} demand zones")
+    if confluence is not None:
+        with METRICS.timer("cycle.confluence"):
+            confluence.update(rates)
+
+    print("Processing live data...")
+
+    # Execute live trades
+    with METRICS.timer("cycle.evaluate_and_trade"):
+        evaluate_and_trade(mt5, symbol, tracker.supply_zones, tracker.demand_zones, cache=cache, indicators=indicators,
+                           zone_index=tracker.index, confluence=confluence, risk=risk, timeframe=timeframe)
+    METRICS.record("cycle.total", time.perf_counter_ns() - started)
+    return True
+
+def simulate(symbol, path, timeframe=SimulatedBroker.TIMEFRAME_M15, quiet=True):
+    """
+    Run the unchanged live decision path against a SimulatedBroker replaying recorded bars
+    """
+    history_bars = LOOKBACK_DAYS * 24 * 3600 // timeframe_seconds(timeframe)
+    broker = SimulatedBroker.from_file(path, symbol, timeframe=timeframe, start_index=100)
+    cache = BarCache(broker, history_bars=history_bars)
+    tracker = ZoneTracker(lookback_seconds=LOOKBACK_DAYS * 24 * 3600, index=new_zone_index(broker, symbol))
+    indicators = IndicatorRegistry()
+    confluence = new_confluence(broker, symbol, timeframe)
+    risk = RiskEngine(broker)
+
+    started = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        if quiet:
+            # execute_trades reports every decision; silence it so the replay runs at full speed
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+        while True:
+            run_cycle(broker, symbol, timeframe, cache, tracker, indicators, confluence, risk)
+            if not broker.advance():
+                break
+    broker.result(time.perf_counter() - started).print_summary()
+    print(METRICS.report())
+
+def replay_ticks(symbol, path, history_path=None, timeframe=SimulatedBroker.TIMEFRAME_M15, quiet=True):
+    """
+    Run the live decision path against recorded ticks: a full cycle whenever a bar closes and an
+    entry check whenever price starts touching a zone, as the scanner does between bar closes.
+    `history_path` is a BarCache file whose bars before the first tick warm up zones and indicators.
+    """
+    history_bars = LOOKBACK_DAYS * 24 * 3600 // timeframe_seconds(timeframe)
+    history = np.load(history_path) if history_path else None
+    broker = TickReplayBroker.from_file(path, symbol, timeframe=timeframe, history=history)
+    cache = BarCache(broker, history_bars=history_bars)
+    tracker = ZoneTracker(lookback_seconds=LOOKBACK_DAYS * 24 * 3600, index=new_zone_index(broker, symbol))
+    indicators = IndicatorRegistry()
+    confluence = new_confluence(broker, symbol, timeframe)
+    risk = RiskEngine(broker)
+
+    started = time.perf_counter()
+    in_zone = (False, False)
+    with contextlib.ExitStack() as stack:
+        if quiet:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+        run_cycle(broker, symbol, timeframe, cache, tracker, indicators, confluence, risk)
+        while broker.advance():
+            if broker.bar_closed:
+                run_cycle(broker, symbol, timeframe, cache, tracker, indicators, confluence, risk)
+                continue
+            tick = broker.tick
+            touching = (zone_entry(SUPPLY, tick.bid, tracker.index, confluence),
+                        zone_entry(DEMAND, tick.ask, tracker.index, confluence))
+            if any(now and not before for now, before in zip(touching, in_zone)):
+                cache.refresh(symbol, timeframe)
+                evaluate_and_trade(broker, symbol, tracker.supply_zones, tracker.demand_zones, cache=cache,
+                                   indicators=indicators, zone_index=tracker.index, confluence=confluence,
+                                   risk=risk, timeframe=timeframe)
+            in_zone = touching
+    elapsed = time.perf_counter() - started
+    print(f"Replayed {broker.ticks_seen} ticks in {elapsed:.1f}s ({broker.ticks_seen / elapsed:.0f} ticks/s)")
+    broker.result(elapsed).print_summary()
+    print(METRICS.report())
+
+def report_startup(budget):
+    """Record launch-to-first-scan time and say whether it stayed within `budget` seconds"""
+    elapsed = time.perf_counter() - _STARTED
+    METRICS.record("startup.total", int(elapsed * 1e9))
+    over = f" - over the {budget:.1f}s startup budget" if budget and elapsed > budget else ""
+    print(f"Trading {elapsed:.2f}s after launch{over}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Supply/demand zone trading bot")
+    parser.add_argument("--config", help="JSON file overriding the settings in config.DEFAULTS")
+    parser.add_argument("--mode", choices=("live", "mock", "sim", "ticks"))
+    parser.add_argument("--symbol", action="append", metavar="SYMBOL[:TIMEFRAME]",
+                        help="Trade this pair instead of the configured universe (repeatable, timeframe defaults to M15)")
+    parser.add_argument("--cold-start", action="store_true", help="Ignore the saved zone/indicator state")
+    args = parser.parse_args(argv)
+
+    universe = [(symbol.partition(":")[0], symbol.partition(":")[2] or "M15") for symbol in args.symbol or ()]
+    config = load_config(args.config, {"mode": args.mode, "universe": universe or None})
+    universe = [(symbol, parse_timeframe(str(timeframe))) for symbol, timeframe in config["universe"]]
+    symbol, timeframe = universe[0]  # Base series; H1/H4/D1 zones are resampled from it
+
+    if config["mode"] == 'sim':
+        simulate(symbol, config["sim_file"], timeframe)
         return
-        
-    # Replace with your login credentials
-    account = 48688301
-    password = "Homethe06!"
-    server = "HFMarketsGlobal-Demo"
-
-    authorized = mt5.login(account, password=password, server=server)
-    if not authorized:
-        print(f"Failed to connect at account #{account}, error code: {mt5.last_error()}")
-        mt5.shutdown()
+    if config["mode"] == 'ticks':
+        replay_ticks(symbol, config["tick_file"], history_path=config["sim_file"], timeframe=timeframe)
         return
-        
-    print(f"Connected to account #{account}")
-
-    # Set the symbol and timeframe
-    symbol = "EURUSD"
-    timeframe = mt5.TIMEFRAME_M15  # Hourly data
 
+    with METRICS.timer("startup.connect"):
+        mt5 = LiveBroker()
+        if not mt5.initialize():
+            print("initialize() failed")
+            mt5.shutdown()
+            return
 
-    if MODE == 'live':
+        account = config["login"]
+        if account is None:
+            # Credentials come from MT5_LOGIN/MT5_PASSWORD/MT5_SERVER or the config file, never from code
+            print("No login configured - using the account the terminal is logged in to")
+        elif not mt5.login(account, password=config["password"], server=config["server"]):
+            print(f"Failed to connect at account #{account}, error code: {mt5.last_error()}")
+            mt5.shutdown()
+            return
+        else:
+            print(f"Connected to account #{account}")
+
+    if config["mode"] == 'live':
+        # Live-only modules are imported here so the other modes never load them
+        from history_store import HistoryStore
+        from scanner import Scanner
+        from scheduler import BarScheduler, estimate_server_offset
+        from state import load_state, save_state
+        from ticks import TickRecorder
+
+        recorder = TickRecorder(config["tick_dir"]) if config["tick_dir"] else None
+        if recorder is not None:
+            # Keep every polled tick for replay_ticks
+            mt5 = RecordingBroker(mt5, recorder)
+        # Time every terminal call
+        mt5 = InstrumentedBroker(mt5, METRICS)
+        if config["metrics_port"]:
+            METRICS.serve(config["metrics_port"])
+
+        # Every pair in the universe is scanned each cycle; zone seeding runs on a process pool
+        history_bars = max(LOOKBACK_DAYS * 24 * 3600 // timeframe_seconds(tf) for _, tf in universe)
+        scanner = Scanner(mt5, universe, history_bars=history_bars,
+                          lookback_seconds=LOOKBACK_DAYS * 24 * 3600, cache_dir=config["cache_dir"],
+                          store=HistoryStore(config["history_dir"]))
+        state_file = config["state_file"]
+        if state_file and not args.cold_start:
+            # Warm start: zones and indicators resume from the last scan, so the first scan
+            # only feeds the bars that closed while the bot was down
+            with METRICS.timer("startup.restore"):
+                state = load_state(state_file, config["state_max_age"])
+                if state is not None:
+                    print(f"Restored state for {scanner.restore(state)} pair(s) from {state_file}")
+
+        first_scan = True
+
+        def on_bar_close(timeframes, expected):
+            nonlocal first_scan
+            scanned = scanner.scan(timeframes, expected)
+            if state_file:
+                with METRICS.timer("cycle.save_state"):
+                    save_state(state_file, scanner.state())
+            if first_scan:
+                first_scan = False
+                report_startup(config["startup_budget"])
+            if config["metrics_file"]:
+                METRICS.write(config["metrics_file"])
+            # Retried until every pair has the bar that just closed
+            return scanned == sum(1 for _, tf in universe if tf in timeframes)
+        # Wake on bar closes, and watch ticks for zone touches in between
+        scheduler = BarScheduler({tf for _, tf in universe}, on_bar_close, on_tick=scanner.watch_ticks,
+                                 tick_interval=config["tick_interval"],
+                                 server_offset=estimate_server_offset(mt5, symbol))
         try:
-            while True:
-                # Define the time range for fetching historical data
-                end_date = pd.Timestamp.now()
-                start_date = end_date - pd.DateOffset(days=30)  # Adjust as needed
-
-                # Fetch historical data
-                rates = mt5.copy_rates_range(symbol, timeframe, start_date.to_pydatetime(), end_date.to_pydatetime())
-                if rates is None:
-                    print(f"Failed to get rates for {symbol}, error code: {mt5.last_error()}")
-                    time.sleep(300)  # Wait before retrying
-                    continue
-
-                # Create DataFrame
-                df = pd.DataFrame(rates)
-                df['time'] = pd.to_datetime(df['time'], unit='s')
-                df.set_index('time', inplace=True)
-
-                # Find supply and demand zones
-                supply_zones, demand_zones = find_zones(df)
-
-                print("Processing live data...")
-
-                # Execute live trades
-                open_sell_positions(mt5, symbol, supply_zones)
-                open_buy_positions(mt5, symbol, demand_zones)
-
-            
-                # Wait for 10 seconds before checking again
-                time.sleep(10)
+            scheduler.run()
         finally:
+            scanner.close()
+            if recorder is not None:
+                recorder.close()
             mt5.shutdown()
-    elif MODE == 'mock':
-        # Mock trading setup
-        global open_positions, balance
-        open_positions = []  # Clear mock positions
-        balance = 10000  # Reset balance
-
-        # Set the symbol and timeframe for mock testing
-        start_date = pd.Timestamp('2023-01-01')
-        end_date = pd.Timestamp('2023-12-31')
-
-        # Fetch historical data
-        rates = mt5.copy_rates_range(symbol, timeframe, start_date.to_pydatetime(), end_date.to_pydatetime())
-        
-        if rates is None:
+    elif config["mode"] == 'mock':
+        from backtest import Backtester
+
+        # Fetch historical data for the backtest
+        rates = mt5.copy_rates_range(symbol, timeframe, datetime(2023, 1, 1), datetime(2023, 12, 31))
+        symbol_info = mt5.symbol_info(symbol)
+        account_info = mt5.account_info()
+        if rates is None or symbol_info is None:
             print(f"Failed to get rates for {symbol}, error code: {mt5.last_error()}")
             mt5.shutdown()
             return
-      
-        # Create DataFrame
-        df = pd.DataFrame(rates)
-        df['time'] = pd.to_datetime(df['time'], unit='s')
-        df.set_index('time', inplace=True)
-
-        # Find supply and demand zones
-        supply_zones, demand_zones = find_zones(df)
-        
-        # Loop through each row of the DataFrame
-        for index, row in df.iterrows():
-            current_price = row['close']
-            print(f"Processing date: {index}, Price: {current_price}, Balance: {balance}")
-
-            # Execute mock trades
-            print(mock_open_sell_positions(symbol, supply_zones))
-            print(mock_open_buy_positions(symbol, demand_zones))
-
-            # Pause for a short duration to simulate trading time
-            time.sleep(1)
-
-            # Optionally, you can simulate more actions here
+        mt5.shutdown()
 
+        # Replay the bars through the same entry/SL/TP rules as live trading
+        backtester = Backtester(point=symbol_info.point, tick_value=symbol_info.trade_tick_value,
+                                contract_size=symbol_info.trade_contract_size,
+                                leverage=account_info.leverage if account_info else 100)
+        backtester.run(rates).print_summary()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,382 @@
+import argparse
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+from bar_cache import parse_timeframe, timeframe_seconds
+from confluence import resample, HIGHER_TIMEFRAMES, CONFLUENCE_WEIGHTS
+from zones import pivot_masks, ZoneIndex, SUPPLY, DEMAND
+from indicators import ema_series, rsi_series, volatility_series, SPIKE
+from execute_trades import (classify_market, sell_signal, buy_signal, stop_loss_pips, position_size,
+                            StrategyParams, ZONE_MERGE_PIPS, ZONE_TOUCH_PIPS, MIN_CONFLUENCE_SCORE,
+                            DUPLICATE_ENTRY_PIPS)
+
+MARKET_WINDOW = 20 + 14  # Bars get_market_condition measures the price change over
+
+TRADE_DTYPE = np.dtype([
+    ('entry_index', 'i8'), ('exit_index', 'i8'), ('side', 'i1'),
+    ('entry', 'f8'), ('exit', 'f8'), ('volume', 'f8'), ('profit', 'f8'),
+])
+
+SELL, BUY = -1, 1
+
+def latest_zone_indices(rates: np.ndarray, pivots=None):
+    """
+    Bar index of the most recent supply/demand zone known at each bar (-1 before the first one).
+    A pivot at bar i is only confirmed once bar i + 2 has closed, so there is no look-ahead.
+    """
+    n = len(rates)
+    support, resistance = pivots or pivot_masks(rates['low'], rates['high'])
+    result = []
+    for mask in (resistance, support):
+        confirmed = np.full(n, -1)
+        confirmed[2:] = np.where(mask, np.arange(n), -1)[:-2]
+        result.append(np.maximum.accumulate(confirmed))
+    return result[0], result[1]
+
+class Features:
+    """
+    Per-bar inputs derived from one rates array, computed on first use and kept.
+    Parameter sweeps reuse one instance so zones and indicators are only computed once
+    for every combination that shares them.
+    """
+    def __init__(self, rates: np.ndarray):
+        self.rates = rates
+        self.opens, self.highs, self.lows, self.closes = (np.ascontiguousarray(rates[f], dtype=np.float64)
+                                                          for f in ('open', 'high', 'low', 'close'))
+        self._ema: Dict[int, np.ndarray] = {}
+        self._rsi = None
+        self._price_change = None
+        self._pivots = None
+        self._zones = None
+        self._volatility = None
+        self._higher: Dict[int, tuple] = {}
+        self._zone_entries: Dict[tuple, tuple] = {}
+
+    def pivots(self):
+        """(support, resistance) pivot masks"""
+        if self._pivots is None:
+            self._pivots = pivot_masks(self.lows, self.highs)
+        return self._pivots
+
+    def ema(self, span: int) -> np.ndarray:
+        if span not in self._ema:
+            self._ema[span] = ema_series(self.closes, span)
+        return self._ema[span]
+
+    def rsi(self) -> np.ndarray:
+        if self._rsi is None:
+            self._rsi = rsi_series(self.closes)
+        return self._rsi
+
+    def volatility(self) -> np.ndarray:
+        """Volatility regime of each bar against the bars before it (indicators.volatility_series)"""
+        if self._volatility is None:
+            self._volatility = volatility_series(self.highs, self.lows, self.closes)
+        return self._volatility
+
+    def price_change(self) -> np.ndarray:
+        if self._price_change is None:
+            closes, n = self.closes, len(self.closes)
+            self._price_change = np.full(n, np.nan)
+            self._price_change[MARKET_WINDOW - 1:] = (closes[MARKET_WINDOW - 1:] - closes[:n - MARKET_WINDOW + 1]) / closes[:n - MARKET_WINDOW + 1] * 100
+        return self._price_change
+
+    def higher_timeframe(self, seconds: int):
+        """
+        (rates, support, resistance, closes_at) for the series resampled to `seconds` bars.
+        closes_at[t] is the higher bar that closes with base bar t, or -1.
+        """
+        if seconds not in self._higher:
+            higher = resample(self.rates, seconds)
+            support, resistance = pivot_masks(higher['low'], higher['high'])
+            buckets = self.rates['time'] // seconds
+            k = np.searchsorted(higher['time'] // seconds, buckets)
+            last_in_bucket = np.append(buckets[1:] != buckets[:-1], False)
+            known = (k < len(higher)) & (higher['time'][np.minimum(k, len(higher) - 1)] // seconds == buckets)
+            closes_at = np.where(last_in_bucket & known, k, -1)
+            self._higher[seconds] = (higher, support, resistance, closes_at)
+        return self._higher[seconds]
+
+    def spread(self, point: float, default_points: int) -> np.ndarray:
+        """Spread in price at each bar: the recorded one where the rates have it, else `default_points`"""
+        spread = np.full(len(self.closes), default_points * point)
+        if 'spread' in (self.rates.dtype.names or ()):
+            spread = np.where(self.rates['spread'] > 0, self.rates['spread'] * point, spread)
+        return spread
+
+    def zone_entries(self, lookback_days: float, point: float, spread_points: int,
+                     timeframes: Iterable[int] = HIGHER_TIMEFRAMES) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (supply, demand) masks of the bars whose close has the bid in a valid supply zone or the ask in
+        a valid demand zone, decided like execute_trades.zone_entry: a ZoneIndex fed bar by bar the way
+        the live ZoneTracker does, scored with the `timeframes` longer than these bars, each resampled
+        from them and advanced as its own bars close. Only the lookback and the prices matter, so every
+        run sharing them reuses one computation.
+        """
+        key = (lookback_days, point, spread_points, tuple(timeframes))
+        if key in self._zone_entries:
+            return self._zone_entries[key]
+        n = len(self.closes)
+        highs, lows, closes, times = self.highs, self.lows, self.closes, self.rates['time']
+        asks = closes + self.spread(point, spread_points)
+        zone_index = ZoneIndex(ZONE_MERGE_PIPS * point, ZONE_TOUCH_PIPS * point)
+        support, resistance = self.pivots()
+        lookback_seconds = lookback_days * 24 * 3600
+        base_seconds = int(np.diff(times).min()) if n > 1 else 0
+        # [weight, index, rates, support, resistance, closes_at] per higher timeframe
+        higher = [[CONFLUENCE_WEIGHTS.get(tf, 1), ZoneIndex(zone_index.merge_distance, zone_index.touch_distance),
+                   *self.higher_timeframe(timeframe_seconds(tf))]
+                  for tf in timeframes if timeframe_seconds(tf) > base_seconds]
+        entries = (np.zeros(n, dtype=bool), np.zeros(n, dtype=bool))
+        for t in range(n):
+            # Same order as ZoneTracker: the pivot confirmed by this close joins, then the close breaks bands
+            if t >= 2 and resistance[t - 2]:
+                zone_index.add(SUPPLY, int(times[t - 2]), highs[t - 2])
+            if t >= 2 and support[t - 2]:
+                zone_index.add(DEMAND, int(times[t - 2]), lows[t - 2])
+            zone_index.invalidate(closes[t])
+            zone_index.expire(int(times[t]) - lookback_seconds)
+            for _, index, h_rates, h_support, h_resistance, closes_at in higher:
+                k = closes_at[t]
+                if k < 0:
+                    continue
+                if k >= 2 and h_resistance[k - 2]:
+                    index.add(SUPPLY, int(h_rates['time'][k - 2]), h_rates['high'][k - 2])
+                if k >= 2 and h_support[k - 2]:
+                    index.add(DEMAND, int(h_rates['time'][k - 2]), h_rates['low'][k - 2])
+                index.invalidate(float(h_rates['close'][k]))
+                index.expire(int(h_rates['time'][k]) - lookback_seconds)
+            for mask, kind, price in ((entries[0], SUPPLY, closes[t]), (entries[1], DEMAND, asks[t])):
+                score = 1 if zone_index.touching(kind, price) is not None else 0
+                if higher:
+                    score += sum(weight for weight, index, *_ in higher if index.touching(kind, price) is not None)
+                    mask[t] = score >= MIN_CONFLUENCE_SCORE
+                else:
+                    mask[t] = score > 0
+        self._zone_entries[key] = entries
+        return entries
+
+    def zone_prices(self, lookback_days: float):
+        """Latest supply/demand zone price at each bar, NaN when none is within the lookback"""
+        if self._zones is None:
+            self._zones = latest_zone_indices(self.rates, self.pivots())
+        times = self.rates['time']
+        prices = []
+        for last, source in zip(self._zones, (self.highs, self.lows)):
+            valid = (last >= 0) & (times - times[np.maximum(last, 0)] <= lookback_days * 24 * 3600)
+            prices.append(np.where(valid, source[np.maximum(last, 0)], np.nan))
+        return prices[0], prices[1]
+
+class BacktestResult:
+    def __init__(self, equity: np.ndarray, trades: np.ndarray, initial_balance: float, elapsed: float):
+        self.equity = equity
+        self.trades = trades
+        self.initial_balance = initial_balance
+        self.elapsed = elapsed
+
+    def summary(self) -> Dict[str, float]:
+        equity = self.equity
+        peak = np.maximum.accumulate(equity) if len(equity) else equity
+        drawdown = peak - equity
+        profits = self.trades['profit']
+        wins = profits[profits > 0]
+        losses = profits[profits <= 0]
+        elapsed = max(self.elapsed, 1e-9)
+        net = float(equity[-1] - self.initial_balance) if len(equity) else 0.0
+        return_pct = net / self.initial_balance * 100
+        drawdown_pct = float((drawdown / peak).max() * 100) if len(drawdown) else 0.0
+        return {
+            "bars": len(equity),
+            "trades": len(profits),
+            "net_pnl": net,
+            "return_pct": return_pct,
+            "max_drawdown": float(drawdown.max()) if len(drawdown) else 0.0,
+            "max_drawdown_pct": drawdown_pct,
+            # Return per unit of drawdown; 0 when there was no drawdown to divide by
+            "calmar": return_pct / drawdown_pct if drawdown_pct > 0 else 0.0,
+            "win_rate": len(wins) / len(profits) * 100 if len(profits) else 0.0,
+            "profit_factor": float(wins.sum() / -losses.sum()) if losses.sum() < 0 else float('inf'),
+            "elapsed_s": self.elapsed,
+            "bars_per_s": len(equity) / elapsed,
+            "trades_per_s": len(profits) / elapsed,
+        }
+
+    def print_summary(self) -> None:
+        s = self.summary()
+        print(f"Bars: {s['bars']}, Trades: {s['trades']}, Win rate: {s['win_rate']:.1f}%")
+        print(f"Net PnL: {s['net_pnl']:.2f} ({s['return_pct']:.2f}%), Profit factor: {s['profit_factor']:.2f}")
+        print(f"Max drawdown: {s['max_drawdown']:.2f} ({s['max_drawdown_pct']:.2f}%), Calmar: {s['calmar']:.2f}")
+        print(f"Replayed in {s['elapsed_s']:.3f}s - {s['bars_per_s']:.0f} bars/s, {s['trades_per_s']:.0f} trades/s")
+
+class Backtester:
+    """
+    Bar-by-bar replay of the execute_trades entry/SL/TP rules at full speed.
+    Decisions are made on each bar close (bid = close, ask = close + spread) and SL/TP
+    are filled against later bars' high/low; when both are inside one bar the stop wins.
+    Zone entries use a ZoneIndex fed bar by bar like the live ZoneTracker does, scored with the
+    `confluence_timeframes` longer than the replayed bars, each resampled from them and advanced
+    as its own bars close. Pass use_zone_index=False for the older latest-zone-only rule.
+    The news filter skips bars whose volatility regime is SPIKE, as the live path does with a bar
+    cache; pass use_volatility_regime=False for the older fixed open-close threshold.
+    """
+    def __init__(self, point: float = 0.00001, tick_value: float = 1.0, spread_points: int = 10,
+                 initial_balance: float = 10000.0, contract_size: float = 100000, leverage: float = 100,
+                 params: Optional[StrategyParams] = None, use_zone_index: bool = True,
+                 confluence_timeframes: Iterable[int] = HIGHER_TIMEFRAMES, use_volatility_regime: bool = True):
+        self.point = point
+        self.tick_value = tick_value
+        self.spread_points = spread_points
+        self.initial_balance = initial_balance
+        self.contract_size = contract_size
+        self.leverage = leverage
+        self.params = params or StrategyParams()
+        self.use_zone_index = use_zone_index
+        self.confluence_timeframes = tuple(confluence_timeframes)
+        self.use_volatility_regime = use_volatility_regime
+
+    def run(self, rates: np.ndarray, features: Optional[Features] = None, start: int = 0,
+            end: Optional[int] = None) -> BacktestResult:
+        """
+        Pass `features` built from the same rates to reuse zones and indicators between runs.
+        With `start`/`end` only bars in [start, end) trade and the result covers just them; zones and
+        indicators come from the whole series, so a window of a long history trades on the same
+        zones as a full run.
+        """
+        started = time.perf_counter()
+        params = self.params
+        features = features or Features(rates)
+        n = len(rates)
+        end = n if end is None else min(end, n)
+        opens, highs, lows, closes = features.opens, features.highs, features.lows, features.closes
+        spread = features.spread(self.point, self.spread_points)
+
+        # Everything that does not depend on open positions is computed up front
+        ema_fast = features.ema(params.ema_fast)
+        ema_slow = features.ema(params.ema_slow)
+        rsi = features.rsi()
+        price_change = features.price_change()
+        if self.use_volatility_regime:
+            news = features.volatility() == SPIKE
+        else:
+            news = np.abs(closes - opens) / self.point > params.impact_threshold_pips
+        supply_price, demand_price = features.zone_prices(params.lookback_days)
+        zone_entries = None
+        if self.use_zone_index:
+            zone_entries = dict(zip((SUPPLY, DEMAND), features.zone_entries(
+                params.lookback_days, self.point, self.spread_points, self.confluence_timeframes)))
+
+        equity = np.full(n, self.initial_balance)
+        trades = []
+        positions = []  # [side, entry, sl, tp, volume, entry_index]
+        balance = self.initial_balance
+        point, tick_value = self.point, self.tick_value
+
+        for t in range(max(MARKET_WINDOW - 1, start), end):
+            # Close positions whose SL/TP was reached inside this bar
+            if positions:
+                still_open = []
+                for pos in positions:
+                    side, entry, sl, tp, volume, _ = pos
+                    if side == SELL:
+                        # Shorts are closed at the ask
+                        bar_open, bar_high, bar_low = opens[t] + spread[t], highs[t] + spread[t], lows[t] + spread[t]
+                        exit_price = max(sl, bar_open) if bar_high >= sl else (min(tp, bar_open) if bar_low <= tp else None)
+                    else:
+                        bar_open, bar_high, bar_low = opens[t], highs[t], lows[t]
+                        exit_price = min(sl, bar_open) if bar_low <= sl else (max(tp, bar_open) if bar_high >= tp else None)
+                    if exit_price is None:
+                        still_open.append(pos)
+                        continue
+                    profit = side * (exit_price - entry) / point * tick_value * volume
+                    balance += profit
+                    trades.append((pos[5], t, side, entry, exit_price, volume, profit))
+                positions = still_open
+
+            # Mark open positions to market at the close
+            bid, ask = closes[t], closes[t] + spread[t]
+            floating = 0.0
+            used_margin = 0.0
+            for side, entry, _, _, volume, _ in positions:
+                floating += side * ((bid if side == BUY else ask) - entry) / point * tick_value * volume
+                used_margin += volume * self.contract_size * entry / self.leverage
+            equity[t] = balance + floating
+
+            # Check for high volatility/news impact first
+            if news[t] or t == end - 1:
+                continue
+            market_condition, trend_strength = classify_market(ema_fast[t], ema_slow[t], rsi[t], price_change[t])
+
+            for side, price, zone, kind, signal in ((SELL, bid, supply_price[t], SUPPLY, sell_signal),
+                                                    (BUY, ask, demand_price[t], DEMAND, buy_signal)):
+                same_side = [pos for pos in positions if pos[0] == side]
+                if len(same_side) >= params.max_positions:
+                    continue
+                zone_price = None if np.isnan(zone) else zone
+                in_zone = bool(zone_entries[kind][t]) if zone_entries is not None else None
+                if not signal(market_condition, trend_strength, price, zone_price, params.trend_threshold, in_zone):
+                    continue
+                if any(abs(pos[1] - price) < DUPLICATE_ENTRY_PIPS * point for pos in same_side):
+                    continue
+
+                sl_pips = stop_loss_pips(trend_strength, params.sl_pips)
+                volume = position_size(balance, point, tick_value, params.risk_percent, sl_pips)
+                margin_needed = volume * self.contract_size * price / self.leverage
+                if equity[t] - used_margin < margin_needed:
+                    continue
+                used_margin += margin_needed
+                sl = price - side * sl_pips * point
+                tp = price + side * sl_pips * params.risk_reward * point
+                positions.append([side, price, sl, tp, volume, t])
+
+        # Whatever is still open is closed at the final bar
+        if end > start:
+            last = end - 1
+            for side, entry, _, _, volume, entry_index in positions:
+                exit_price = closes[last] if side == BUY else closes[last] + spread[last]
+                profit = side * (exit_price - entry) / point * tick_value * volume
+                balance += profit
+                trades.append((entry_index, last, side, entry, exit_price, volume, profit))
+            equity[last] = balance
+
+        return BacktestResult(equity[start:end], np.array(trades, dtype=TRADE_DTYPE), self.initial_balance,
+                              time.perf_counter() - started)
+
+def load_rates(path: str) -> np.ndarray:
+    """Rates array saved by BarCache"""
+    return np.load(path)
+
+def load_store_range(root: str, symbol: str, timeframe: int, start: Optional[str] = None,
+                     end: Optional[str] = None) -> np.ndarray:
+    """Memmapped bars from a HistoryStore between two YYYY-MM-DD dates (UTC)"""
+    from history_store import HistoryStore
+
+    def to_unix(day):
+        return int(datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()) if day else None
+    return HistoryStore(root).range(symbol, timeframe, to_unix(start), to_unix(end))
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay cached bars through the execute_trades rules")
+    parser.add_argument("symbol")
+    parser.add_argument("--timeframe", type=parse_timeframe, default="M15")
+    parser.add_argument("--cache-dir", default="bar_cache")
+    parser.add_argument("--store", help="Read bars from this HistoryStore directory instead of the cache")
+    parser.add_argument("--start", help="First day to replay (YYYY-MM-DD, store only)")
+    parser.add_argument("--end", help="Day to stop before (YYYY-MM-DD, store only)")
+    parser.add_argument("--point", type=float, default=0.00001)
+    parser.add_argument("--tick-value", type=float, default=1.0)
+    parser.add_argument("--spread", type=int, default=10, help="Spread in points when bars carry none")
+    parser.add_argument("--balance", type=float, default=10000.0)
+    args = parser.parse_args(argv)
+
+    if args.store:
+        rates = load_store_range(args.store, args.symbol, args.timeframe, args.start, args.end)
+    else:
+        rates = load_rates(os.path.join(args.cache_dir, f"{args.symbol}_{args.timeframe}.npy"))
+    backtester = Backtester(point=args.point, tick_value=args.tick_value, spread_points=args.spread,
+                            initial_balance=args.balance)
+    backtester.run(rates).print_summary()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import os
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+DELTA_BARS = 4  # Bars requested per refresh once a series is cached
+
+# MT5 TIMEFRAME_* values by name, for command-line tools
+TIMEFRAMES = {
+    "M1": 1, "M5": 5, "M15": 15, "M30": 30,
+    "H1": 0x4001, "H4": 0x4004, "D1": 0x4018, "W1": 0x8001, "MN1": 0xC001,
+}
+
+def timeframe_seconds(timeframe: int) -> int:
+    """
+    Length of one bar for an MT5 TIMEFRAME_* constant.
+    Minute frames are the minute count, hour frames carry the 0x4000 flag, W1/MN1 carry 0x8000/0xC000.
+    """
+    if timeframe & 0xC000 == 0xC000:
+        return (timeframe & 0x3FFF) * 30 * 24 * 3600  # Months are approximated as 30 days
+    if timeframe & 0x8000:
+        return (timeframe & 0x3FFF) * 7 * 24 * 3600
+    if timeframe & 0x4000:
+        return (timeframe & 0x3FFF) * 3600
+    return timeframe * 60
+
+def parse_timeframe(value: str) -> int:
+    """A TIMEFRAMES name (e.g. "M15") or a raw TIMEFRAME_* number"""
+    if value.upper() in TIMEFRAMES:
+        return TIMEFRAMES[value.upper()]
+    return int(value)
+
+class BarCache:
+    """
+    Per (symbol, timeframe) OHLC cache holding contiguous MT5 rates arrays.
+    After the first fill only bars newer than the last cached one are requested.
+    The newest bar in each series is the one still forming, as with copy_rates_from_pos(..., 0, n).
+    """
+    def __init__(self, mt5, history_bars: int = 2880, cache_dir: Optional[str] = None, store=None):
+        """
+        `store` is an optional HistoryStore: series are seeded from it before asking the terminal,
+        and newly closed bars are appended to it.
+        """
+        self.mt5 = mt5
+        self.history_bars = history_bars
+        self.cache_dir = cache_dir
+        self.store = store
+        self._series: Dict[Tuple[str, int], np.ndarray] = {}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def refresh(self, symbol: str, timeframe: int) -> Optional[int]:
+        """
+        Pull bars newer than the cached ones from the terminal.
+        Returns the number of newly closed bars, or None if the terminal returned no data.
+        """
+        key = (symbol, timeframe)
+        cached = self._series.get(key)
+        if cached is None:
+            cached = self._load(symbol, timeframe)
+        if (cached is None or len(cached) == 0) and self.store is not None:
+            cached = np.array(self.store.tail(symbol, timeframe, self.history_bars))
+
+        if cached is None or len(cached) == 0:
+            rates = self.mt5.copy_rates_from_pos(symbol, timeframe, 0, self.history_bars)
+            if rates is None or len(rates) == 0:
+                return None
+            self._series[key] = rates
+            self._save(symbol, timeframe)
+            return len(rates) - 1
+
+        # Widen the request until it overlaps the cached series (or we would re-pull everything anyway)
+        last_time = cached['time'][-1]
+        count = DELTA_BARS
+        while True:
+            rates = self.mt5.copy_rates_from_pos(symbol, timeframe, 0, count)
+            if rates is None or len(rates) == 0:
+                self._series[key] = cached
+                return None
+            if rates['time'][0] <= last_time or count >= self.history_bars:
+                break
+            count = min(count * 4, self.history_bars)
+
+        if rates['time'][0] <= last_time:
+            keep = cached[cached['time'] < rates['time'][0]]
+            merged = np.concatenate([keep, rates.astype(cached.dtype)])
+        else:
+            merged = rates
+        self._series[key] = merged[-self.history_bars:]
+
+        new_bars = int(np.count_nonzero(rates['time'] > last_time))
+        if new_bars:
+            self._save(symbol, timeframe)
+        return new_bars
+
+    def bars(self, symbol: str, timeframe: int) -> Optional[np.ndarray]:
+        """Full cached series, filled from the terminal on first use"""
+        key = (symbol, timeframe)
+        if key not in self._series:
+            self.refresh(symbol, timeframe)
+        return self._series.get(key)
+
+    def tail(self, symbol: str, timeframe: int, count: int) -> Optional[np.ndarray]:
+        """Last `count` bars, same shape as mt5.copy_rates_from_pos(symbol, timeframe, 0, count)"""
+        rates = self.bars(symbol, timeframe)
+        if rates is None:
+            return None
+        return rates[-count:]
+
+    def _path(self, symbol: str, timeframe: int) -> str:
+        return os.path.join(self.cache_dir, f"{symbol}_{timeframe}.npy")
+
+    def _load(self, symbol: str, timeframe: int) -> Optional[np.ndarray]:
+        if not self.cache_dir or not os.path.exists(self._path(symbol, timeframe)):
+            return None
+        try:
+            return np.load(self._path(symbol, timeframe))
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable bar cache for {symbol}: {e}")
+            return None
+
+    def _save(self, symbol: str, timeframe: int) -> None:
+        if self.store is not None:
+            # Everything but the forming bar is final
+            self.store.append(symbol, timeframe, self._series[(symbol, timeframe)][:-1])
+        if not self.cache_dir:
+            return
+        path = self._path(symbol, timeframe)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, self._series[(symbol, timeframe)])
+        os.replace(tmp_path, path)
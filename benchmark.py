@@ -0,0 +1,223 @@
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from bar_cache import BarCache
+from broker import SimulatedBroker
+from history_store import RATES_DTYPE
+from indicators import IndicatorRegistry, volatility_series, SPIKE
+from zones import find_zones
+from execute_trades import (get_market_condition, calculate_position_size, build_snapshot,
+                            open_sell_positions, open_buy_positions, MAX_POSITIONS)
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+DECISION_BARS = 2880  # Bars the live cache holds; the decision-path benchmarks run at this size
+SYMBOL = "EURUSD"
+MIN_TIME = 0.2  # Seconds each benchmark is repeated for, at least
+MAX_REPEATS = 1000
+TOLERANCE = 0.25  # Allowed slowdown / memory growth over the baseline before it counts as a regression
+
+def synthetic_rates(n: int, seed: int = 0, volatility: float = 0.0002, start: int = 1672531200) -> np.ndarray:
+    """
+    Reproducible M15 bars: a geometric random walk for the closes, with highs/lows spread
+    randomly around each bar's open/close. Same seed and size, same bars.
+    """
+    rng = np.random.default_rng(seed)
+    closes = np.round(1.1 * np.exp(np.cumsum(rng.normal(0, volatility, n))), 5)
+    opens = np.concatenate([[1.1], closes[:-1]])
+    rates = np.zeros(n, dtype=RATES_DTYPE)
+    rates['time'] = start + np.arange(n) * 900
+    rates['open'] = opens
+    rates['close'] = closes
+    rates['high'] = np.round(np.maximum(opens, closes) + rng.random(n) * volatility, 5)
+    rates['low'] = np.round(np.minimum(opens, closes) - rng.random(n) * volatility, 5)
+    rates['tick_volume'] = rng.integers(50, 500, n)
+    rates['spread'] = rng.integers(5, 15, n)
+    return rates
+
+def measure(fn: Callable[[], object], setup: Optional[Callable[[], None]] = None) -> Dict[str, float]:
+    """
+    Median and best wall time of fn() over repeated runs, then tracemalloc's peak over one more run
+    (traced separately so tracing does not inflate the timings). `setup` runs untimed before each call.
+    """
+    times: List[float] = []
+    total = 0.0
+    while total < MIN_TIME and len(times) < MAX_REPEATS:
+        if setup:
+            setup()
+        gc.collect()
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        times.append(elapsed)
+        total += elapsed
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"median_s": statistics.median(times), "best_s": min(times), "runs": len(times), "peak_bytes": peak}
+
+def bench_find_zones(rates: np.ndarray) -> Dict[str, float]:
+    df = pd.DataFrame(rates)
+    df.index = pd.to_datetime(df['time'], unit='s')
+    return measure(lambda: find_zones(df))
+
+def quiet_bar(rates: np.ndarray) -> int:
+    """
+    Index of the last bar the news filter passes (volatility regime not SPIKE, as build_snapshot
+    classifies it with a cache), so the decision path runs to the order
+    """
+    regimes = volatility_series(rates['high'], rates['low'], rates['close'])
+    return int(np.flatnonzero(regimes != SPIKE)[-1])
+
+def live_setup(rates: np.ndarray):
+    """SimulatedBroker positioned at a quiet bar, with a filled BarCache and warmed IndicatorRegistry"""
+    broker = SimulatedBroker(SYMBOL, rates, start_index=quiet_bar(rates))
+    cache = BarCache(broker, history_bars=len(rates))
+    cache.refresh(SYMBOL, broker.TIMEFRAME_M15)
+    indicators = IndicatorRegistry()
+    get_market_condition(broker, SYMBOL, cache=cache, indicators=indicators)
+    return broker, cache, indicators
+
+def bench_market_condition_cold(rates: np.ndarray) -> Dict[str, float]:
+    """First call: indicators are seeded over every cached bar"""
+    broker, cache, _ = live_setup(rates)
+    return measure(lambda: get_market_condition(broker, SYMBOL, cache=cache, indicators=IndicatorRegistry()))
+
+def bench_market_condition_warm(rates: np.ndarray) -> Dict[str, float]:
+    """Steady state: no new bars, the indicators only peek at the forming bar"""
+    broker, cache, indicators = live_setup(rates)
+    return measure(lambda: get_market_condition(broker, SYMBOL, cache=cache, indicators=indicators))
+
+def bench_position_size(rates: np.ndarray) -> Dict[str, float]:
+    broker, cache, indicators = live_setup(rates)
+    snapshot = build_snapshot(broker, SYMBOL, cache=cache, indicators=indicators)
+    return measure(lambda: calculate_position_size(broker, SYMBOL, snapshot=snapshot))
+
+def bench_open_positions(rates: np.ndarray, sell: bool) -> Dict[str, float]:
+    """
+    Snapshot, signal, sizing, margin check and order_send, with a zone just behind price so
+    the order is placed. The position is closed again (untimed) before the next run.
+    """
+    broker, cache, indicators = live_setup(rates)
+    tick = broker.symbol_info_tick(SYMBOL)
+    zone_time = pd.Timestamp(int(rates['time'][broker.index]), unit='s')
+    zones = [(zone_time, tick.bid - 0.0001)] if sell else [(zone_time, tick.ask + 0.0001)]
+    open_positions = open_sell_positions if sell else open_buy_positions
+
+    def close_all():
+        for pos in broker.positions_get(symbol=SYMBOL):
+            closing = broker.ORDER_TYPE_BUY if pos.type == broker.POSITION_TYPE_SELL else broker.ORDER_TYPE_SELL
+            broker.order_send({"action": broker.TRADE_ACTION_DEAL, "symbol": SYMBOL, "volume": pos.volume,
+                               "type": closing, "position": pos.ticket})
+
+    def run():
+        snapshot = build_snapshot(broker, SYMBOL, cache=cache, indicators=indicators)
+        if not open_positions(broker, SYMBOL, zones, MAX_POSITIONS, snapshot=snapshot):
+            raise RuntimeError("benchmark order was not placed")
+    return measure(run, setup=close_all)
+
+BENCHMARKS = {
+    "find_zones": (bench_find_zones, True),
+    "market_condition_cold": (bench_market_condition_cold, True),
+    "market_condition_warm": (bench_market_condition_warm, False),
+    "calculate_position_size": (bench_position_size, False),
+    "open_sell_positions": (lambda rates: bench_open_positions(rates, sell=True), False),
+    "open_buy_positions": (lambda rates: bench_open_positions(rates, sell=False), False),
+}
+
+def run_benchmarks(names: List[str], sizes: List[int], seed: int = 0) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """{benchmark: {bars: measurement}}; benchmarks that do not scale with history run at DECISION_BARS"""
+    results: Dict[str, Dict[str, Dict[str, float]]] = {name: {} for name in names}
+    for size in sorted(set(sizes) | {DECISION_BARS}):
+        rates = None
+        for name in names:
+            fn, scales = BENCHMARKS[name]
+            if (size not in sizes) if scales else (size != DECISION_BARS):
+                continue
+            if rates is None:
+                rates = synthetic_rates(size, seed)
+            # execute_trades reports every decision; keep that out of the timings and the output
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                m = results[name][str(size)] = fn(rates)
+            print(f"{name:<26} {size:>10} bars  median {m['median_s'] * 1e3:10.3f} ms  "
+                  f"best {m['best_s'] * 1e3:10.3f} ms  peak {m['peak_bytes'] / 2**20:8.2f} MiB  ({m['runs']} runs)",
+                  flush=True)
+    return results
+
+def compare(results: Dict, baseline: Dict, tolerance: float = TOLERANCE) -> List[str]:
+    """
+    Regressions against the baseline's best time and peak memory, as printable lines.
+    Best-of-N is compared rather than the median because it is the least sensitive to machine noise.
+    """
+    regressions = []
+    for name, by_size in results.items():
+        for size, m in by_size.items():
+            base = baseline.get("results", {}).get(name, {}).get(size)
+            if base is None:
+                continue
+            for key, label in (("best_s", "time"), ("peak_bytes", "memory")):
+                if base[key] > 0 and m[key] > base[key] * (1 + tolerance):
+                    regressions.append(f"{name} @ {size} bars: {label} {m[key] / base[key]:.2f}x baseline "
+                                       f"({base[key]:.6g} -> {m[key]:.6g})")
+    return regressions
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark zone detection, indicators and the order decision path")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in SIZES),
+                        help="Comma-separated bar counts for the benchmarks that scale with history")
+    parser.add_argument("--only", action="append", choices=list(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default="benchmark_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--out", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    results = run_benchmarks(args.only or list(BENCHMARKS), sizes, args.seed)
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "seed": args.seed,
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        # A check with nothing to check against must not pass silently
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 1
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%} of {args.baseline}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,446 @@
+import itertools
+import random
+import threading
+import time
+from collections import namedtuple
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Protocol
+import numpy as np
+from bar_cache import timeframe_seconds
+from history_store import RATES_DTYPE
+
+if TYPE_CHECKING:
+    # backtest pulls in the strategy and zone modules; only the simulators' result() needs it
+    from backtest import BacktestResult
+
+# MetaTrader5 return types, with the fields the bot reads
+Tick = namedtuple("Tick", "time bid ask last volume time_msc flags volume_real")
+SymbolInfo = namedtuple("SymbolInfo", "name point digits spread trade_tick_value trade_tick_size "
+                                      "trade_contract_size volume_min volume_max volume_step "
+                                      "currency_base currency_profit currency_margin")
+AccountInfo = namedtuple("AccountInfo", "login balance equity profit margin margin_free margin_level leverage currency")
+TradePosition = namedtuple("TradePosition", "ticket time type magic identifier volume price_open sl tp "
+                                            "price_current profit symbol comment")
+OrderSendResult = namedtuple("OrderSendResult", "retcode deal order volume price bid ask comment request_id "
+                                                "retcode_external request")
+
+class Broker(Protocol):
+    """
+    The subset of the MetaTrader5 module API the bot uses.
+    execute_trades and the live loop take any object with this shape as their `mt5` argument:
+    the MetaTrader5 module itself, a wrapper forwarding to it, or a simulator. Simulators subclass
+    this to inherit the constants; wrappers forward them along with every call.
+    """
+    TIMEFRAME_M1 = 1
+    TIMEFRAME_M5 = 5
+    TIMEFRAME_M15 = 15
+    TIMEFRAME_M30 = 30
+    TIMEFRAME_H1 = 0x4001
+    TIMEFRAME_H4 = 0x4004
+    TIMEFRAME_D1 = 0x4018
+
+    ORDER_TYPE_BUY = 0
+    ORDER_TYPE_SELL = 1
+    POSITION_TYPE_BUY = 0
+    POSITION_TYPE_SELL = 1
+    TRADE_ACTION_DEAL = 1
+    ORDER_TIME_GTC = 0
+
+    TRADE_RETCODE_REQUOTE = 10004
+    TRADE_RETCODE_REJECT = 10006
+    TRADE_RETCODE_DONE = 10009
+    TRADE_RETCODE_INVALID = 10013
+    TRADE_RETCODE_INVALID_VOLUME = 10014
+    TRADE_RETCODE_NO_MONEY = 10019
+    TRADE_RETCODE_PRICE_CHANGED = 10020
+    TRADE_RETCODE_PRICE_OFF = 10021
+
+    def initialize(self, *args, **kwargs) -> bool: ...
+    def login(self, login, password=None, server=None) -> bool: ...
+    def shutdown(self) -> None: ...
+    def last_error(self) -> tuple: ...
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count) -> Optional[np.ndarray]: ...
+    def copy_rates_range(self, symbol, timeframe, date_from, date_to) -> Optional[np.ndarray]: ...
+    def symbol_info(self, symbol) -> Optional[SymbolInfo]: ...
+    def symbol_info_tick(self, symbol) -> Optional[Tick]: ...
+    def account_info(self) -> Optional[AccountInfo]: ...
+    def positions_get(self, symbol=None, ticket=None) -> Optional[tuple]: ...
+    def order_calc_margin(self, action, symbol, volume, price) -> Optional[float]: ...
+    def order_send(self, request) -> Optional[OrderSendResult]: ...
+
+class LiveBroker:
+    """
+    The MetaTrader5 terminal. Every call and constant is forwarded to the MetaTrader5 module,
+    which is only imported here so the rest of the bot runs where the terminal is unavailable.
+    """
+    def __init__(self):
+        import MetaTrader5
+        self._mt5 = MetaTrader5
+
+    def __getattribute__(self, name):
+        if name.startswith("_") or name in ("__class__", "__dict__"):
+            return object.__getattribute__(self, name)
+        return getattr(object.__getattribute__(self, "_mt5"), name)
+
+class SimulatedBroker(Broker):
+    """
+    Deterministic local stand-in for the terminal that replays one recorded bar series.
+    The current bar is treated as the forming one: its close is the bid and bid + spread the ask.
+    advance() moves to the next bar and fills SL/TP against its high/low (stop first when both are hit).
+    Market orders pay `slippage_points` of adverse slippage and are margin-checked against free margin.
+    """
+    def __init__(self, symbol: str, rates: np.ndarray, timeframe: int = Broker.TIMEFRAME_M15,
+                 balance: float = 10000.0, leverage: int = 100, point: float = 0.00001, digits: int = 5,
+                 tick_value: float = 1.0, contract_size: float = 100000, spread_points: int = 10,
+                 slippage_points: int = 0, seed: int = 0, start_index: int = 0):
+        self.symbol = symbol
+        self.rates = rates
+        self.timeframe = timeframe
+        self.initial_balance = balance
+        self.balance = balance
+        self.leverage = leverage
+        self.point = point
+        self.digits = digits
+        self.tick_value = tick_value
+        self.contract_size = contract_size
+        self.spread_points = spread_points
+        self.slippage_points = slippage_points
+        self.index = start_index
+        self._random = random.Random(seed)
+        self._positions: Dict[int, TradePosition] = {}
+        self._entry_index: Dict[int, int] = {}
+        self._next_ticket = 1
+        self._error = (1, "Success")
+        self.equity_curve = np.full(len(rates), balance)
+        self.trades = []
+
+    @classmethod
+    def from_file(cls, path: str, symbol: str, **kwargs) -> "SimulatedBroker":
+        """Replay a rates array saved by BarCache"""
+        return cls(symbol, np.load(path), **kwargs)
+
+    # Session
+    def initialize(self, *args, **kwargs):
+        return True
+
+    def login(self, login, password=None, server=None):
+        return True
+
+    def shutdown(self):
+        pass
+
+    def last_error(self):
+        return self._error
+
+    # Clock
+    def advance(self) -> bool:
+        """Move to the next bar, filling any SL/TP it reaches. Returns False once the data is exhausted."""
+        self.equity_curve[self.index] = self._equity()
+        if self.index + 1 >= len(self.rates):
+            return False
+        self.index += 1
+        bar = self.rates[self.index]
+        spread = self._spread()
+        for ticket, pos in list(self._positions.items()):
+            if pos.type == self.POSITION_TYPE_BUY:
+                bar_open, bar_high, bar_low = bar['open'], bar['high'], bar['low']
+                if pos.sl and bar_low <= pos.sl:
+                    self._close(ticket, min(pos.sl, bar_open))
+                elif pos.tp and bar_high >= pos.tp:
+                    self._close(ticket, max(pos.tp, bar_open))
+            else:
+                # Shorts are closed at the ask
+                bar_open, bar_high, bar_low = bar['open'] + spread, bar['high'] + spread, bar['low'] + spread
+                if pos.sl and bar_high >= pos.sl:
+                    self._close(ticket, max(pos.sl, bar_open))
+                elif pos.tp and bar_low <= pos.tp:
+                    self._close(ticket, min(pos.tp, bar_open))
+        return True
+
+    def result(self, elapsed: float = 0.0) -> "BacktestResult":
+        """Equity and closed trades so far, in the backtester's format"""
+        from backtest import BacktestResult, TRADE_DTYPE
+        equity = self.equity_curve[:self.index + 1].copy()
+        equity[-1] = self._equity()
+        return BacktestResult(equity, np.array(self.trades, dtype=TRADE_DTYPE), self.initial_balance, elapsed)
+
+    # Market data
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        if symbol != self.symbol or timeframe != self.timeframe:
+            self._error = (-2, "Invalid params")
+            return None
+        end = self.index + 1 - start_pos
+        return self.rates[max(0, end - count):max(0, end)].copy()
+
+    def copy_rates_range(self, symbol, timeframe, date_from, date_to):
+        if symbol != self.symbol or timeframe != self.timeframe:
+            self._error = (-2, "Invalid params")
+            return None
+        visible = self.rates[:self.index + 1]
+        times = visible['time']
+        mask = (times >= int(date_from.timestamp())) & (times <= int(date_to.timestamp()))
+        return visible[mask].copy()
+
+    def symbol_info(self, symbol):
+        if symbol != self.symbol:
+            return None
+        return SymbolInfo(symbol, self.point, self.digits, int(self._spread() / self.point), self.tick_value,
+                          self.point, self.contract_size, 0.01, 100.0, 0.01,
+                          symbol[:3], symbol[3:6], symbol[:3])
+
+    def symbol_info_tick(self, symbol):
+        if symbol != self.symbol:
+            return None
+        bar = self.rates[self.index]
+        bid = float(bar['close'])
+        return Tick(int(bar['time']), bid, round(bid + self._spread(), self.digits), 0.0, 0,
+                    int(bar['time']) * 1000, 0, 0.0)
+
+    # Account
+    def account_info(self):
+        margin = sum(self._margin(pos.volume, pos.price_open) for pos in self._positions.values())
+        equity = self._equity()
+        margin_level = equity / margin * 100 if margin else 0.0
+        return AccountInfo(0, self.balance, equity, equity - self.balance, margin, equity - margin,
+                           margin_level, self.leverage, "USD")
+
+    def positions_get(self, symbol=None, ticket=None):
+        positions = [self._marked(pos) for pos in self._positions.values()
+                     if (symbol is None or pos.symbol == symbol) and (ticket is None or pos.ticket == ticket)]
+        return tuple(positions)
+
+    def order_calc_margin(self, action, symbol, volume, price):
+        if symbol != self.symbol:
+            return None
+        return self._margin(volume, price)
+
+    def order_send(self, request):
+        tick = self.symbol_info_tick(self.symbol)
+        if request.get("symbol") != self.symbol or request.get("action") != self.TRADE_ACTION_DEAL:
+            return self._result(self.TRADE_RETCODE_INVALID, request, tick)
+        order_type = request.get("type")
+        volume = float(request.get("volume", 0))
+        if order_type not in (self.ORDER_TYPE_BUY, self.ORDER_TYPE_SELL):
+            return self._result(self.TRADE_RETCODE_INVALID, request, tick)
+        if volume < 0.01:
+            return self._result(self.TRADE_RETCODE_INVALID_VOLUME, request, tick)
+
+        # Adverse slippage, then the deviation check the terminal would do
+        slippage = self._random.randint(0, self.slippage_points) * self.point if self.slippage_points else 0.0
+        if order_type == self.ORDER_TYPE_BUY:
+            price = round(tick.ask + slippage, self.digits)
+        else:
+            price = round(tick.bid - slippage, self.digits)
+        requested = request.get("price")
+        if requested and abs(price - requested) > request.get("deviation", 0) * self.point + 1e-12:
+            return self._result(self.TRADE_RETCODE_REQUOTE, request, tick)
+
+        if "position" in request:
+            # Closing deal for an existing position
+            if request["position"] not in self._positions:
+                return self._result(self.TRADE_RETCODE_INVALID, request, tick)
+            self._close(request["position"], price)
+            return self._result(self.TRADE_RETCODE_DONE, request, tick, volume, price)
+
+        if self.account_info().margin_free < self._margin(volume, price):
+            return self._result(self.TRADE_RETCODE_NO_MONEY, request, tick)
+
+        ticket = self._next_ticket
+        self._next_ticket += 1
+        position_type = self.POSITION_TYPE_BUY if order_type == self.ORDER_TYPE_BUY else self.POSITION_TYPE_SELL
+        self._positions[ticket] = TradePosition(ticket, tick.time, position_type, request.get("magic", 0), ticket,
+                                                volume, price, request.get("sl", 0.0), request.get("tp", 0.0),
+                                                price, 0.0, self.symbol, request.get("comment", ""))
+        self._entry_index[ticket] = self.index
+        return self._result(self.TRADE_RETCODE_DONE, request, tick, volume, price, ticket)
+
+    # Internals
+    def _spread(self) -> float:
+        bar_spread = int(self.rates[self.index]['spread']) if 'spread' in self.rates.dtype.names else 0
+        return (bar_spread or self.spread_points) * self.point
+
+    def _margin(self, volume: float, price: float) -> float:
+        return volume * self.contract_size * price / self.leverage
+
+    def _profit(self, pos: TradePosition, price: float) -> float:
+        direction = 1 if pos.type == self.POSITION_TYPE_BUY else -1
+        return direction * (price - pos.price_open) / self.point * self.tick_value * pos.volume
+
+    def _current_price(self, pos: TradePosition) -> float:
+        bid = float(self.rates[self.index]['close'])
+        return bid if pos.type == self.POSITION_TYPE_BUY else bid + self._spread()
+
+    def _marked(self, pos: TradePosition) -> TradePosition:
+        price = self._current_price(pos)
+        return pos._replace(price_current=price, profit=self._profit(pos, price))
+
+    def _equity(self) -> float:
+        return self.balance + sum(self._profit(pos, self._current_price(pos)) for pos in self._positions.values())
+
+    def _close(self, ticket: int, price: float) -> None:
+        pos = self._positions.pop(ticket)
+        profit = self._profit(pos, price)
+        self.balance += profit
+        side = 1 if pos.type == self.POSITION_TYPE_BUY else -1
+        self.trades.append((self._entry_index.pop(ticket), self.index, side, pos.price_open, price, pos.volume, profit))
+
+    def _result(self, retcode, request, tick, volume=0.0, price=0.0, order=0) -> OrderSendResult:
+        self._error = (1, "Success") if retcode == self.TRADE_RETCODE_DONE else (retcode, "Trade rejected")
+        return OrderSendResult(retcode, order, order, volume, price, tick.bid, tick.ask, "", 0, 0, request)
+
+class TickReplayBroker(SimulatedBroker):
+    """
+    SimulatedBroker driven by a stream of ticks (e.g. ticks.replay) instead of bar closes.
+    Each advance() consumes one tick: bars are built from the bids as they arrive, the newest one
+    forming, orders fill at that tick's bid/ask, and SL/TP are checked on every tick, so which one a
+    position reaches first inside a bar is known instead of assumed. Ticks are pulled one at a time,
+    so a replay never holds more than the bars built so far.
+    `history` is bars preceding the first tick, for zone detection and indicator warmup; any from the
+    first tick's bar on are dropped.
+    """
+    def __init__(self, symbol: str, ticks: Iterable, timeframe: int = Broker.TIMEFRAME_M15,
+                 history: Optional[np.ndarray] = None, **kwargs):
+        ticks = iter(ticks)
+        first = next(ticks, None)
+        if first is None:
+            raise ValueError("No ticks to replay")
+        self._seconds = timeframe_seconds(timeframe)
+        history = np.empty(0, dtype=RATES_DTYPE) if history is None else history
+        history = history[history['time'] < first.time - first.time % self._seconds]
+        super().__init__(symbol, history, timeframe=timeframe, **kwargs)
+        self._ticks = itertools.chain((first,), ticks)
+        self._buffer = np.zeros(max(1024, 2 * len(history)), dtype=RATES_DTYPE)
+        for name in RATES_DTYPE.names:
+            self._buffer[name][:len(history)] = history[name]
+        self._count = len(history)
+        self._equity_by_bar: List[float] = []
+        self.tick = None
+        self.bar_closed = False  # True when the current tick opened a new bar
+        self.ticks_seen = 0
+        self.advance()
+        # Nothing was open before the first tick
+        self._equity_by_bar = [self.balance] * self.index
+
+    @classmethod
+    def from_file(cls, path: str, symbol: str, history: Optional[np.ndarray] = None, **kwargs) -> "TickReplayBroker":
+        """Stream a tick file written by ticks.TickRecorder"""
+        from ticks import replay
+        return cls(symbol, replay(path), history=history, **kwargs)
+
+    def advance(self) -> bool:
+        """Move to the next tick, filling any SL/TP it reaches. Returns False once the ticks are exhausted."""
+        tick = next(self._ticks, None)
+        if tick is None:
+            return False
+        bucket = tick.time - tick.time % self._seconds
+        spread_points = int(round((tick.ask - tick.bid) / self.point))
+        if self._count == 0 or bucket > self._buffer['time'][self._count - 1]:
+            if self.tick is not None:
+                self._equity_by_bar.append(self._equity())
+            if self._count == len(self._buffer):
+                self._buffer = np.concatenate([self._buffer, np.zeros(len(self._buffer), dtype=RATES_DTYPE)])
+            self._buffer[self._count] = (bucket, tick.bid, tick.bid, tick.bid, tick.bid, 1, spread_points, 0)
+            self._count += 1
+            self.rates = self._buffer[:self._count]
+            self.index = self._count - 1
+            self.bar_closed = self.tick is not None
+        else:
+            bar = self._buffer[self._count - 1]
+            bar['high'] = max(bar['high'], tick.bid)
+            bar['low'] = min(bar['low'], tick.bid)
+            bar['close'] = tick.bid
+            bar['tick_volume'] += 1
+            bar['spread'] = min(bar['spread'], spread_points)
+            self.bar_closed = False
+        self.tick = tick
+        self.ticks_seen += 1
+
+        for ticket, pos in list(self._positions.items()):
+            # Longs close at the bid and shorts at the ask, at the first tick on or past the level
+            if pos.type == self.POSITION_TYPE_BUY:
+                if (pos.sl and tick.bid <= pos.sl) or (pos.tp and tick.bid >= pos.tp):
+                    self._close(ticket, tick.bid)
+            elif (pos.sl and tick.ask >= pos.sl) or (pos.tp and tick.ask <= pos.tp):
+                self._close(ticket, tick.ask)
+        return True
+
+    def result(self, elapsed: float = 0.0) -> "BacktestResult":
+        from backtest import BacktestResult, TRADE_DTYPE
+        equity = np.array(self._equity_by_bar + [self._equity()])
+        return BacktestResult(equity, np.array(self.trades, dtype=TRADE_DTYPE), self.initial_balance, elapsed)
+
+    def symbol_info_tick(self, symbol):
+        if symbol != self.symbol:
+            return None
+        return self.tick
+
+    def _spread(self) -> float:
+        return self.tick.ask - self.tick.bid
+
+    def _current_price(self, pos: TradePosition) -> float:
+        return self.tick.bid if pos.type == self.POSITION_TYPE_BUY else self.tick.ask
+
+class RecordingBroker:
+    """
+    Forwards everything to a broker and hands each symbol_info_tick result to a ticks.TickRecorder,
+    so a live run leaves tick files TickReplayBroker can replay.
+    """
+    def __init__(self, broker, recorder):
+        self._broker = broker
+        self._recorder = recorder
+
+    def __getattribute__(self, name):
+        if name.startswith("_") or name == "symbol_info_tick":
+            return object.__getattribute__(self, name)
+        return getattr(object.__getattribute__(self, "_broker"), name)
+
+    def symbol_info_tick(self, symbol):
+        tick = self._broker.symbol_info_tick(symbol)
+        if tick is not None:
+            self._recorder.record(symbol, tick)
+        return tick
+
+class InstrumentedBroker:
+    """
+    Forwards everything to a broker and times each call into a "broker.<name>" histogram
+    """
+    def __init__(self, broker, metrics):
+        self._broker = broker
+        self._metrics = metrics
+
+    def __getattribute__(self, name):
+        if name.startswith("_"):
+            return object.__getattribute__(self, name)
+        attr = getattr(object.__getattribute__(self, "_broker"), name)
+        if not callable(attr):
+            return attr
+        histogram = object.__getattribute__(self, "_metrics").histogram(f"broker.{name}")
+
+        def call(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                histogram.record(time.perf_counter_ns() - start)
+        return call
+
+class SerializedBroker:
+    """
+    Wraps a broker so calls from several threads reach it one at a time.
+    The MetaTrader5 module talks to a single terminal connection and is not documented as thread-safe.
+    """
+    def __init__(self, broker):
+        self._broker = broker
+        self._lock = threading.Lock()
+
+    def __getattribute__(self, name):
+        if name.startswith("_"):
+            return object.__getattribute__(self, name)
+        attr = getattr(object.__getattribute__(self, "_broker"), name)
+        if not callable(attr):
+            return attr
+        lock = object.__getattribute__(self, "_lock")
+
+        def call(*args, **kwargs):
+            with lock:
+                return attr(*args, **kwargs)
+        return call
@@ -0,0 +1,45 @@
+import json
+import os
+from typing import Dict, Optional
+
+# Every setting the entry point reads, with its default. A JSON config file overrides these,
+# the environment overrides the file for credentials, and command-line flags override both.
+DEFAULTS = {
+    "mode": "live",  # 'live', 'mock' (fast bar backtest), 'sim' (live logic against SimulatedBroker) or 'ticks' (tick replay)
+    "universe": [["EURUSD", "M15"]],  # [symbol, timeframe name] pairs watched in live mode
+    "cache_dir": "bar_cache",  # Cached bars are persisted here between restarts
+    "history_dir": "history",  # HistoryStore that seeds the cache and receives every closed bar
+    "tick_interval": 2.0,  # Seconds between zone-touch checks while waiting for a bar close
+    "sim_file": os.path.join("bar_cache", "EURUSD_15.npy"),  # Bars replayed in 'sim' mode
+    "tick_dir": "ticks",  # Ticks polled in live mode are recorded here; null to disable
+    "tick_file": os.path.join("ticks", "EURUSD.ticks"),  # Ticks replayed in 'ticks' mode, with sim_file as history
+    "metrics_file": "metrics.json",  # Stage/broker latency histograms, rewritten after every scan; null to disable
+    "metrics_port": 9108,  # Local HTTP endpoint for /metrics, /metrics.txt and /profile?seconds=N; null to disable
+    "state_file": "bot_state.pkl",  # Zone/indicator state saved after every scan for warm starts; null to disable
+    "state_max_age": 7 * 24 * 3600,  # Saved state older than this (seconds) is ignored
+    "startup_budget": 1.0,  # Seconds from launch to the first completed scan before startup is reported as slow
+    "login": None,
+    "password": None,
+    "server": None,
+}
+
+# Credentials are best kept out of config files entirely
+ENV_CREDENTIALS = {"login": "MT5_LOGIN", "password": "MT5_PASSWORD", "server": "MT5_SERVER"}
+
+def load_config(path: Optional[str] = None, overrides: Optional[Dict] = None, environ=os.environ) -> Dict:
+    """DEFAULTS, then the JSON file at `path`, then MT5_* credentials from the environment, then `overrides`"""
+    config = dict(DEFAULTS)
+    if path:
+        with open(path) as f:
+            loaded = json.load(f)
+        unknown = set(loaded) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown setting(s) in {path}: {', '.join(sorted(unknown))}")
+        config.update(loaded)
+    for key, name in ENV_CREDENTIALS.items():
+        if environ.get(name):
+            config[key] = environ[name]
+    config.update({key: value for key, value in (overrides or {}).items() if value is not None})
+    if config["login"] is not None:
+        config["login"] = int(config["login"])
+    return config
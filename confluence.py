@@ -0,0 +1,87 @@
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from bar_cache import TIMEFRAMES, timeframe_seconds
+from zones import ZoneIndex, ZoneTracker
+
+HIGHER_TIMEFRAMES = (TIMEFRAMES["H1"], TIMEFRAMES["H4"], TIMEFRAMES["D1"])
+# Score a touched zone adds per timeframe; the base timeframe counts 1
+CONFLUENCE_WEIGHTS = {TIMEFRAMES["H1"]: 1, TIMEFRAMES["H4"]: 2, TIMEFRAMES["D1"]: 3}
+
+def resample(rates: np.ndarray, seconds: int) -> np.ndarray:
+    """
+    Aggregate an MT5 rates array into `seconds`-long bars aligned to multiples of `seconds`.
+    A leading bucket the series starts part-way into is left out; the last bucket is whatever
+    the base bars so far make of it, i.e. still forming when the newest base bar is.
+    """
+    if len(rates) == 0:
+        return rates[:0].copy()
+    buckets = rates['time'] // seconds
+    starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+    if rates['time'][0] % seconds:
+        starts = starts[1:]
+    if len(starts) == 0:
+        return rates[:0].copy()
+    ends = np.append(starts[1:], len(rates)) - 1
+    out = np.zeros(len(starts), dtype=rates.dtype)
+    out['time'] = buckets[starts] * seconds
+    out['open'] = rates['open'][starts]
+    out['high'] = np.maximum.reduceat(rates['high'], starts)
+    out['low'] = np.minimum.reduceat(rates['low'], starts)
+    out['close'] = rates['close'][ends]
+    for field in ('tick_volume', 'real_volume'):
+        if field in rates.dtype.names:
+            out[field] = np.add.reduceat(rates[field], starts)
+    if 'spread' in rates.dtype.names:
+        out['spread'] = np.minimum.reduceat(rates['spread'], starts)
+    return out
+
+class TimeframeConfluence:
+    """
+    Supply/demand zone indexes on higher timeframes, built by resampling one base series
+    (e.g. the cached M15 bars) instead of fetching each timeframe from the broker.
+    A timeframe is only resampled and re-scanned when one of its bars closes; between closes
+    update() is one integer division per timeframe.
+    """
+    def __init__(self, lookback_seconds: int, merge_distance: float, touch_distance: float,
+                 timeframes: Iterable[int] = HIGHER_TIMEFRAMES, weights: Optional[Dict[int, int]] = None):
+        self.weights = weights or CONFLUENCE_WEIGHTS
+        self.trackers: Dict[int, ZoneTracker] = {
+            tf: ZoneTracker(lookback_seconds, ZoneIndex(merge_distance, touch_distance)) for tf in timeframes
+        }
+        self._forming: Dict[int, Optional[int]] = {tf: None for tf in self.trackers}
+
+    def update(self, rates: np.ndarray) -> List[int]:
+        """
+        Bring every timeframe up to date with the base rates (newest bar last, still forming).
+        Returns the timeframes that had a bar close and were re-scanned.
+        """
+        if len(rates) == 0:
+            return []
+        now = int(rates['time'][-1])
+        changed = []
+        for tf, tracker in self.trackers.items():
+            seconds = timeframe_seconds(tf)
+            forming = now // seconds
+            if forming == self._forming[tf]:
+                continue
+            self._forming[tf] = forming
+            higher = resample(rates, seconds)
+            if len(higher) == 0:
+                continue
+            if tracker.covers(higher):
+                tracker.update(higher)
+            else:
+                tracker.seed(higher)
+            changed.append(tf)
+        return changed
+
+    def score(self, kind: str, price: float, base_index: Optional[ZoneIndex] = None) -> int:
+        """
+        Weighted count of timeframes with a valid `kind` zone at price: 1 for the base index
+        when given, plus the weight of every higher timeframe whose index is touched
+        """
+        score = 1 if base_index is not None and base_index.touching(kind, price) is not None else 0
+        for tf, tracker in self.trackers.items():
+            if tracker.index.touching(kind, price) is not None:
+                score += self.weights.get(tf, 1)
+        return score
@@ -1,144 +1,354 @@
-def check_news_impact(mt5, symbol, impact_threshold_pips=50):
+import time
+from indicators import IndicatorState, SPIKE
+from metrics import METRICS
+from zones import ZoneIndex, SUPPLY, DEMAND
+from bar_cache import timeframe_seconds
+from confluence import TimeframeConfluence, HIGHER_TIMEFRAMES
+
+# Strong trend thresholds
+STRONG_TREND_THRESHOLD = 0.5  # 0.5% price change
+MIN_SL_PIPS = 100
+RISK_REWARD = 1.5
+NEWS_IMPACT_PIPS = 50  # Single-candle range treated as news volatility
+INDICATOR_WARMUP_BARS = 500  # Bars fetched to seed EMA/RSI when no cache is given
+MAX_POSITIONS = 5  # Per side and symbol
+RISK_PERCENT = 1.0  # Balance risked per trade
+EMA_FAST = 20
+EMA_SLOW = 50
+LOOKBACK_DAYS = 30  # History window used for zone detection
+ZONE_MERGE_PIPS = 30  # Pivots this close together form one zone band
+ZONE_TOUCH_PIPS = 20  # Price this close to a valid band counts as a zone entry
+MIN_CONFLUENCE_SCORE = 2  # Weighted timeframes whose zones price must touch for a zone entry (the base counts 1)
+DUPLICATE_ENTRY_PIPS = 5  # A same-side position opened within this distance blocks a new entry
+
+class StrategyParams:
+    """
+    The tunable strategy constants in one place; the defaults are the live settings
+    """
+    FIELDS = ("sl_pips", "risk_reward", "impact_threshold_pips", "trend_threshold", "max_positions",
+              "risk_percent", "ema_fast", "ema_slow", "lookback_days")
+
+    def __init__(self, sl_pips=MIN_SL_PIPS, risk_reward=RISK_REWARD, impact_threshold_pips=NEWS_IMPACT_PIPS,
+                 trend_threshold=STRONG_TREND_THRESHOLD, max_positions=MAX_POSITIONS, risk_percent=RISK_PERCENT,
+                 ema_fast=EMA_FAST, ema_slow=EMA_SLOW, lookback_days=LOOKBACK_DAYS):
+        self.sl_pips = sl_pips
+        self.risk_reward = risk_reward
+        self.impact_threshold_pips = impact_threshold_pips
+        self.trend_threshold = trend_threshold
+        self.max_positions = max_positions
+        self.risk_percent = risk_percent
+        self.ema_fast = ema_fast
+        self.ema_slow = ema_slow
+        self.lookback_days = lookback_days
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return f"StrategyParams({', '.join(f'{k}={v}' for k, v in self.as_dict().items())})"
+
+def recent_rates(mt5, symbol, count, cache=None, timeframe=None):
+    """
+    Last `count` bars of `timeframe` (M15 by default), read from the shared BarCache when one is given
+    """
+    timeframe = mt5.TIMEFRAME_M15 if timeframe is None else timeframe
+    if cache is not None:
+        return cache.tail(symbol, timeframe, count)
+    return mt5.copy_rates_from_pos(symbol, timeframe, 0, count)
+
+def check_news_impact(mt5, symbol, impact_threshold_pips=NEWS_IMPACT_PIPS, cache=None, point=None, timeframe=None):
     """
     Check for unusual price movements that might indicate news impact
     """
-    rates = mt5.copy_rates_from_pos(symbol, mt5.TIMEFRAME_M15, 0, 2)
-    if rates is None:
+    rates = recent_rates(mt5, symbol, 2, cache, timeframe)
+    if rates is None or len(rates) == 0:
         return True  # Assume high volatility if we can't get data
         
     price_change = abs(rates[-1]['close'] - rates[-1]['open'])
-    point = mt5.symbol_info(symbol).point
+    if point is None:
+        point = mt5.symbol_info(symbol).point
     price_change_pips = price_change / point
     
     return price_change_pips > impact_threshold_pips
 
-def get_market_condition(mt5, symbol, period=15, lookback=20):
+def volatility_regime(mt5, symbol, cache, indicators, timeframe=None):
+    """
+    QUIET/NORMAL/SPIKE for the forming bar, from the cached bars and the symbol's IndicatorState
+    (no broker calls). Replaces check_news_impact when a cache and an IndicatorRegistry are given.
+    """
+    timeframe = mt5.TIMEFRAME_M15 if timeframe is None else timeframe
+    rates = cache.bars(symbol, timeframe)
+    if rates is None or len(rates) == 0:
+        return SPIKE  # Assume high volatility if we can't get data
+    state = indicators.get(symbol, timeframe)
+    state.update(rates)
+    return state.volatility.classify(float(rates['high'][-1]), float(rates['low'][-1]))
+
+def get_market_condition(mt5, symbol, period=15, lookback=20, cache=None, indicators=None, timeframe=None):
     """
     Determine if market is bullish, bearish, or ranging using EMA and RSI
+    EMAs and RSI run over the whole available history of `timeframe` (M15 by default); pass an
+    IndicatorRegistry as `indicators` to keep them between calls so each call only consumes newly closed bars.
     Returns: (condition, strength)
     """
-    rates = mt5.copy_rates_from_pos(symbol, mt5.TIMEFRAME_M15, 0, lookback + 14)  # Extra data for RSI
-    if rates is None:
+    timeframe = mt5.TIMEFRAME_M15 if timeframe is None else timeframe
+    if cache is not None:
+        rates = cache.bars(symbol, timeframe)
+    else:
+        rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, max(lookback + 14, INDICATOR_WARMUP_BARS))
+    if rates is None or len(rates) == 0:
         print("Failed to get historical data")
         return "RANGING", 0
     
-    import numpy as np
-    import pandas as pd
-    
-    df = pd.DataFrame(rates)
-    # Calculate EMAs
-    df['ema20'] = df['close'].ewm(span=20, adjust=False).mean()
-    df['ema50'] = df['close'].ewm(span=50, adjust=False).mean()
-    
-    # Calculate RSI with error handling
-    delta = df['close'].diff()
-    gains = delta.where(delta > 0, 0)
-    losses = -delta.where(delta < 0, 0)
-    
-    # Calculate average gains and losses
-    avg_gains = gains.rolling(window=14).mean()
-    avg_losses = losses.rolling(window=14).mean()
-    
-    # Calculate RS with handling for zero division
-    rs = avg_gains / avg_losses.replace(0, np.inf)
-    df['rsi'] = 100 - (100 / (1 + rs))
-    
-    # Handle any potential NaN values
-    df['rsi'] = df['rsi'].fillna(50)
+    state = indicators.get(symbol, timeframe) if indicators is not None else IndicatorState()
+    state.update(rates)
+    ema20, ema50, current_rsi = state.market_inputs(float(rates['close'][-1]))
     
     # Calculate trend strength
-    price_change = (df['close'].iloc[-1] - df['close'].iloc[0]) / df['close'].iloc[0] * 100
-    current_rsi = float(df['rsi'].iloc[-1])  # Convert to float to avoid comparison issues
-    
-    # Strong trend thresholds
-    STRONG_TREND_THRESHOLD = 0.5  # 0.5% price change
+    window = rates['close'][-(lookback + 14):]
+    price_change = (window[-1] - window[0]) / window[0] * 100
     
-    if df['ema20'].iloc[-1] > df['ema50'].iloc[-1]:
+    return classify_market(ema20, ema50, current_rsi, price_change)
+
+def classify_market(ema20, ema50, rsi, price_change):
+    """
+    Market condition rule shared by the live path and the backtester
+    Returns: (condition, strength)
+    """
+    if ema20 > ema50:
         strength = abs(price_change) if price_change > 0 else 0
-        if current_rsi > 70:
+        if rsi > 70:
             strength *= 0.5  # Reduce strength if potentially overbought
         return "BULLISH", strength
-    elif df['ema20'].iloc[-1] < df['ema50'].iloc[-1]:
+    elif ema20 < ema50:
         strength = abs(price_change) if price_change < 0 else 0
-        if current_rsi < 30:
+        if rsi < 30:
             strength *= 0.5  # Reduce strength if potentially oversold
         return "BEARISH", strength
     else:
         return "RANGING", 0
 
-def calculate_position_size(mt5, symbol, risk_percent=1.0, sl_pips=100):
+def sell_signal(market_condition, trend_strength, bid_price, zone_price, trend_threshold=STRONG_TREND_THRESHOLD,
+                in_zone=None):
     """
-    Calculate position size based on account risk management
+    Sell on a strong bearish trend, or when price trades above the latest supply zone.
+    `in_zone` is a ZoneIndex answer (price touching a valid supply band) and replaces the latest-zone rule.
+    """
+    if market_condition == "BEARISH" and trend_strength > trend_threshold:
+        # Strong bearish trend - we can trade even without supply zone
+        return True
+    # Otherwise we need a valid supply zone entry
+    if in_zone is not None:
+        return in_zone
+    return zone_price is not None and bid_price > zone_price
+
+def buy_signal(market_condition, trend_strength, ask_price, zone_price, trend_threshold=STRONG_TREND_THRESHOLD,
+               in_zone=None):
+    """
+    Buy on a strong bullish trend, or when price trades below the latest demand zone.
+    `in_zone` is a ZoneIndex answer (price touching a valid demand band) and replaces the latest-zone rule.
+    """
+    if market_condition == "BULLISH" and trend_strength > trend_threshold:
+        # Strong bullish trend - we can trade even without demand zone
+        return True
+    # Otherwise we need a valid demand zone entry
+    if in_zone is not None:
+        return in_zone
+    return zone_price is not None and ask_price < zone_price
+
+def stop_loss_pips(trend_strength, min_sl_pips=MIN_SL_PIPS):
+    """
+    Dynamic SL based on trend strength
+    """
+    return max(min_sl_pips, int(min_sl_pips * (1 + trend_strength)))
+
+def position_size(balance, point, tick_value, risk_percent=RISK_PERCENT, sl_pips=MIN_SL_PIPS):
+    """
+    Lots that risk `risk_percent` of balance over `sl_pips` points
     """
-    account_info = mt5.account_info()
-    if account_info is None:
-        return 0.01  # Minimum position size if we can't get account info
-        
-    point = mt5.symbol_info(symbol).point
-    tick_value = mt5.symbol_info(symbol).trade_tick_value
-    
     # Calculate risk amount in account currency
-    risk_amount = account_info.balance * (risk_percent / 100)
+    risk_amount = balance * (risk_percent / 100)
     
     # Calculate position size based on risk
     sl_amount = sl_pips * point * (tick_value / point)
     position_size = risk_amount / sl_amount
     
     # Round down to nearest 0.01
-    position_size = round(max(position_size, 0.01), 2)
-    return position_size
+    return round(max(position_size, 0.01), 2)
+
+def calculate_position_size(mt5, symbol, risk_percent=RISK_PERCENT, sl_pips=MIN_SL_PIPS, snapshot=None):
+    """
+    Calculate position size based on account risk management
+    """
+    if snapshot is None:
+        snapshot = MarketSnapshot(symbol, account_info=mt5.account_info(), symbol_info=mt5.symbol_info(symbol))
+    account_info = snapshot.account_info
+    if account_info is None:
+        return 0.01  # Minimum position size if we can't get account info
+        
+    point = snapshot.symbol_info.point
+    tick_value = snapshot.symbol_info.trade_tick_value
+    
+    return position_size(account_info.balance, point, tick_value, risk_percent, sl_pips)
+
+class MarketSnapshot:
+    """
+    Broker and indicator state for one symbol, read once per cycle and shared by both sides
+    """
+    def __init__(self, symbol, tick=None, symbol_info=None, account_info=None, positions=(),
+                 news_impact=False, market_condition="RANGING", trend_strength=0, volatility=None):
+        self.symbol = symbol
+        self.tick = tick
+        self.symbol_info = symbol_info
+        self.account_info = account_info
+        self.positions = positions
+        self.news_impact = news_impact
+        self.market_condition = market_condition
+        self.trend_strength = trend_strength
+        self.volatility = volatility  # Regime from volatility_regime, None when check_news_impact was used
+        self.created_ns = time.perf_counter_ns()  # Decision-to-order latency is measured from here
+
+def build_snapshot(mt5, symbol, cache=None, market=None, indicators=None, orders=None, risk=None, timeframe=None):
+    """
+    One round of broker reads for `symbol`: tick, symbol info, account info, open positions.
+    Bars of `timeframe` (M15 by default) come from the cache when one is given; `market` skips the
+    market condition evaluation.
+    With both a cache and `indicators`, the news filter is the volatility regime being SPIKE.
+    With an OrderManager as `orders`, positions come from its book (including orders still in flight).
+    With a RiskEngine as `risk`, symbol and account info come from it instead of the terminal.
+    """
+    symbol_info = risk.spec(symbol) if risk is not None else mt5.symbol_info(symbol)
+    positions = orders.positions(symbol) if orders is not None else mt5.positions_get(symbol=symbol)
+    if risk is not None and orders is None and positions is not None:
+        # Without an OrderManager reconciling in the background, the risk engine follows this read
+        risk.update_positions(positions, symbol)
+    volatility = None
+    if cache is not None and indicators is not None:
+        volatility = volatility_regime(mt5, symbol, cache, indicators, timeframe)
+        news_impact = symbol_info is None or volatility == SPIKE
+    else:
+        news_impact = symbol_info is None or check_news_impact(mt5, symbol, cache=cache, point=symbol_info.point,
+                                                               timeframe=timeframe)
+    if market is None:
+        market = get_market_condition(mt5, symbol, cache=cache, indicators=indicators, timeframe=timeframe)
+    return MarketSnapshot(symbol, tick=mt5.symbol_info_tick(symbol), symbol_info=symbol_info,
+                          account_info=risk.account_info() if risk is not None else mt5.account_info(),
+                          positions=tuple(positions or ()),
+                          news_impact=news_impact, market_condition=market[0], trend_strength=market[1],
+                          volatility=volatility)
+
+def new_zone_index(mt5, symbol):
+    """
+    Empty ZoneIndex with the merge/touch distances in the symbol's points; None if the symbol is unknown
+    """
+    symbol_info = mt5.symbol_info(symbol)
+    if symbol_info is None:
+        return None
+    return ZoneIndex(ZONE_MERGE_PIPS * symbol_info.point, ZONE_TOUCH_PIPS * symbol_info.point)
+
+def new_confluence(mt5, symbol, base_timeframe, lookback_seconds=LOOKBACK_DAYS * 24 * 3600):
+    """
+    Empty TimeframeConfluence over the H1/H4/D1 frames longer than `base_timeframe`, sized like
+    new_zone_index; None if the symbol is unknown
+    """
+    symbol_info = mt5.symbol_info(symbol)
+    if symbol_info is None:
+        return None
+    timeframes = [tf for tf in HIGHER_TIMEFRAMES if timeframe_seconds(tf) > timeframe_seconds(base_timeframe)]
+    return TimeframeConfluence(lookback_seconds, ZONE_MERGE_PIPS * symbol_info.point, ZONE_TOUCH_PIPS * symbol_info.point,
+                               timeframes)
+
+def zone_entry(kind, price, zone_index=None, confluence=None):
+    """
+    in_zone for sell_signal/buy_signal: None without a zone index (latest-zone rule), otherwise whether
+    price touches a valid zone - scored across timeframes when a TimeframeConfluence is given, where a
+    base zone alone is not enough: an H1 zone has to agree, or an H4/D1 zone counts on its own
+    """
+    if confluence is not None and confluence.trackers:
+        return confluence.score(kind, price, zone_index) >= MIN_CONFLUENCE_SCORE
+    if zone_index is not None:
+        return zone_index.touching(kind, price) is not None
+    return None
+
+def evaluate_and_trade(mt5, symbol, supply_zones, demand_zones, max_positions=MAX_POSITIONS, cache=None, market=None,
+                       indicators=None, zone_index=None, confluence=None, orders=None, risk=None, timeframe=None):
+    """
+    Evaluate both sides against one snapshot of the bars of `timeframe` (M15 by default). Returns the snapshot used.
+    With a `zone_index`, entries are taken at any still-valid zone instead of only the latest one,
+    and with a `confluence` zone entries are scored across the higher timeframes too.
+    With an OrderManager as `orders`, orders are queued to it instead of sent here, and with a
+    RiskEngine as `risk` sizing and limits are checked locally against the whole portfolio.
+    """
+    snapshot = build_snapshot(mt5, symbol, cache=cache, market=market, indicators=indicators, orders=orders, risk=risk,
+                              timeframe=timeframe)
+    if open_sell_positions(mt5, symbol, supply_zones, max_positions, snapshot=snapshot, zone_index=zone_index,
+                           confluence=confluence, orders=orders, risk=risk) and orders is None:
+        # The sell used margin - the buy side must see the updated account
+        snapshot.account_info = risk.account_info() if risk is not None else mt5.account_info()
+    open_buy_positions(mt5, symbol, demand_zones, max_positions, snapshot=snapshot, zone_index=zone_index,
+                       confluence=confluence, orders=orders, risk=risk)
+    return snapshot
+
+def open_sell_positions(mt5, symbol, supply_zones, max_positions=MAX_POSITIONS, cache=None, market=None, snapshot=None,
+                        zone_index=None, confluence=None, orders=None, risk=None):
+    """
+    Returns True if a sell order was opened, or queued when an OrderManager is given as `orders`
+    """
+    if snapshot is None:
+        snapshot = build_snapshot(mt5, symbol, cache=cache, market=market, orders=orders, risk=risk)
 
-def open_sell_positions(mt5, symbol, supply_zones, max_positions=5):
     # Check for high volatility/news impact first
-    if check_news_impact(mt5, symbol):
+    if snapshot.news_impact:
         print("High volatility detected - avoiding new positions")
-        return
+        return False
     
     # Check market conditions
-    market_condition, trend_strength = get_market_condition(mt5, symbol)
+    market_condition, trend_strength = snapshot.market_condition, snapshot.trend_strength
     
-    open_positions = [pos for pos in list(mt5.positions_get(symbol=symbol)) if pos.type == mt5.ORDER_TYPE_SELL]
+    open_positions = [pos for pos in snapshot.positions if pos.type == mt5.ORDER_TYPE_SELL]
     if len(open_positions) >= max_positions:
         print(f"Maximum of {max_positions} positions already open.")
-        return
+        return False
 
     # Get current price
-    tick = mt5.symbol_info_tick(symbol)
+    tick = snapshot.tick
     if tick is None:
         print("Failed to get current price")
-        return
+        return False
     bid_price = tick.bid
     
     # Determine if we should trade based on both trend and supply zones
-    should_trade = False
-    zone_price = None
+    zone_price = supply_zones[-1][1] if supply_zones else None
+    in_zone = zone_entry(SUPPLY, bid_price, zone_index, confluence)
+    should_trade = sell_signal(market_condition, trend_strength, bid_price, zone_price, in_zone=in_zone)
     
-    if market_condition == "BEARISH" and trend_strength > 0.5:
-        # Strong bearish trend - we can trade even without supply zone
-        should_trade = True
-        zone_price = bid_price
-    elif supply_zones and bid_price > supply_zones[-1][1]:
-        # We have a valid supply zone entry
-        should_trade = True
-        zone_price = supply_zones[-1][1]
-    
-    if should_trade and not any(pos.price_open == bid_price for pos in open_positions):
-        point = mt5.symbol_info(symbol).point
+    point = snapshot.symbol_info.point
+    duplicate = any(abs(pos.price_open - bid_price) < DUPLICATE_ENTRY_PIPS * point for pos in open_positions)
+    if should_trade and not duplicate:
         
         # Dynamic SL based on trend strength
-        sl_pips = max(100, int(100 * (1 + trend_strength)))
+        sl_pips = stop_loss_pips(trend_strength)
         sl_price = bid_price + sl_pips * point
-        tp_price = bid_price - (sl_pips * 1.5) * point  # 1.5 risk:reward ratio
+        tp_price = bid_price - (sl_pips * RISK_REWARD) * point  # 1.5 risk:reward ratio
         
         # Calculate position size based on risk management
-        volume = calculate_position_size(mt5, symbol, risk_percent=1.0, sl_pips=sl_pips)
+        volume = calculate_position_size(mt5, symbol, risk_percent=RISK_PERCENT, sl_pips=sl_pips, snapshot=snapshot)
 
         # Check if there are enough funds
-        margin_needed = mt5.order_calc_margin(mt5.ORDER_TYPE_SELL, symbol, volume, bid_price)
-        account_info = mt5.account_info()
-        if margin_needed is None or account_info.margin_free < margin_needed:
-            print("Not enough money to open sell order.")
-            return
+        if risk is not None:
+            # Margin and portfolio limits, computed locally (in-flight orders are already counted)
+            margin_needed = risk.margin_for(symbol, volume, bid_price)
+            refusal = risk.check(symbol, mt5.ORDER_TYPE_SELL, volume, bid_price, sl_price)
+            if refusal:
+                print(f"Not opening sell order: {refusal}")
+                return False
+        else:
+            margin_needed = mt5.order_calc_margin(mt5.ORDER_TYPE_SELL, symbol, volume, bid_price)
+            account_info = snapshot.account_info
+            pending_margin = orders.pending_margin() if orders is not None else 0.0
+            if margin_needed is None or account_info is None or account_info.margin_free - pending_margin < margin_needed:
+                print("Not enough money to open sell order.")
+                return False
 
         request = {
             "action": mt5.TRADE_ACTION_DEAL,
@@ -153,65 +363,83 @@ def open_sell_positions(mt5, symbol, supply_zones, max_positions=5):
             "comment": f"Sell order - {market_condition} market",
             "type_time": mt5.ORDER_TIME_GTC
         }
+        if orders is not None:
+            client_id = orders.submit(request, margin=margin_needed, created_ns=snapshot.created_ns)
+            print(f"Queued sell order {client_id} at {bid_price} ({market_condition} market, strength: {trend_strength:.2f})")
+            return True
         result = mt5.order_send(request)
+        METRICS.record("order.decision_to_order", time.perf_counter_ns() - snapshot.created_ns)
         if result.retcode != mt5.TRADE_RETCODE_DONE:
             print(f"Failed to open sell order. Retcode: {result.retcode}")
-        else:
-            print(f"Opened sell order at {bid_price} ({market_condition} market, strength: {trend_strength:.2f})")
+            return False
+        if risk is not None:
+            risk.add(result.order, symbol, mt5.ORDER_TYPE_SELL, volume, result.price or bid_price, sl_price)
+        print(f"Opened sell order at {bid_price} ({market_condition} market, strength: {trend_strength:.2f})")
+        return True
     else:
         print(f"Waiting for better sell conditions. Market: {market_condition}, Strength: {trend_strength:.2f}")
+        return False
+
+def open_buy_positions(mt5, symbol, demand_zones, max_positions=MAX_POSITIONS, cache=None, market=None, snapshot=None,
+                       zone_index=None, confluence=None, orders=None, risk=None):
+    """
+    Returns True if a buy order was opened, or queued when an OrderManager is given as `orders`
+    """
+    if snapshot is None:
+        snapshot = build_snapshot(mt5, symbol, cache=cache, market=market, orders=orders, risk=risk)
 
-def open_buy_positions(mt5, symbol, demand_zones, max_positions=5):
     # Check for high volatility/news impact first
-    if check_news_impact(mt5, symbol):
+    if snapshot.news_impact:
         print("High volatility detected - avoiding new positions")
-        return
+        return False
     
     # Check market conditions
-    market_condition, trend_strength = get_market_condition(mt5, symbol)
+    market_condition, trend_strength = snapshot.market_condition, snapshot.trend_strength
     
-    open_positions = [pos for pos in list(mt5.positions_get(symbol=symbol)) if pos.type == mt5.ORDER_TYPE_BUY]
+    open_positions = [pos for pos in snapshot.positions if pos.type == mt5.ORDER_TYPE_BUY]
     if len(open_positions) >= max_positions:
         print(f"Maximum of {max_positions} positions already open.")
-        return
+        return False
 
     # Get current price
-    tick = mt5.symbol_info_tick(symbol)
+    tick = snapshot.tick
     if tick is None:
         print("Failed to get current price")
-        return
+        return False
     ask_price = tick.ask
     
     # Determine if we should trade based on both trend and demand zones
-    should_trade = False
-    zone_price = None
+    zone_price = demand_zones[-1][1] if demand_zones else None
+    in_zone = zone_entry(DEMAND, ask_price, zone_index, confluence)
+    should_trade = buy_signal(market_condition, trend_strength, ask_price, zone_price, in_zone=in_zone)
     
-    if market_condition == "BULLISH" and trend_strength > 0.5:
-        # Strong bullish trend - we can trade even without demand zone
-        should_trade = True
-        zone_price = ask_price
-    elif demand_zones and ask_price < demand_zones[-1][1]:
-        # We have a valid demand zone entry
-        should_trade = True
-        zone_price = demand_zones[-1][1]
-    
-    if should_trade and not any(pos.price_open == ask_price for pos in open_positions):
-        point = mt5.symbol_info(symbol).point
+    point = snapshot.symbol_info.point
+    duplicate = any(abs(pos.price_open - ask_price) < DUPLICATE_ENTRY_PIPS * point for pos in open_positions)
+    if should_trade and not duplicate:
         
         # Dynamic SL based on trend strength
-        sl_pips = max(100, int(100 * (1 + trend_strength)))
+        sl_pips = stop_loss_pips(trend_strength)
         sl_price = ask_price - sl_pips * point
-        tp_price = ask_price + (sl_pips * 1.5) * point  # 1.5 risk:reward ratio
+        tp_price = ask_price + (sl_pips * RISK_REWARD) * point  # 1.5 risk:reward ratio
         
         # Calculate position size based on risk management
-        volume = calculate_position_size(mt5, symbol, risk_percent=1.0, sl_pips=sl_pips)
+        volume = calculate_position_size(mt5, symbol, risk_percent=RISK_PERCENT, sl_pips=sl_pips, snapshot=snapshot)
 
         # Check if there are enough funds
-        margin_needed = mt5.order_calc_margin(mt5.ORDER_TYPE_BUY, symbol, volume, ask_price)
-        account_info = mt5.account_info()
-        if margin_needed is None or account_info.margin_free < margin_needed:
-            print("Not enough money to open buy order.")
-            return
+        if risk is not None:
+            # Margin and portfolio limits, computed locally (in-flight orders are already counted)
+            margin_needed = risk.margin_for(symbol, volume, ask_price)
+            refusal = risk.check(symbol, mt5.ORDER_TYPE_BUY, volume, ask_price, sl_price)
+            if refusal:
+                print(f"Not opening buy order: {refusal}")
+                return False
+        else:
+            margin_needed = mt5.order_calc_margin(mt5.ORDER_TYPE_BUY, symbol, volume, ask_price)
+            account_info = snapshot.account_info
+            pending_margin = orders.pending_margin() if orders is not None else 0.0
+            if margin_needed is None or account_info is None or account_info.margin_free - pending_margin < margin_needed:
+                print("Not enough money to open buy order.")
+                return False
 
         request = {
             "action": mt5.TRADE_ACTION_DEAL,
@@ -226,10 +454,19 @@ def open_buy_positions(mt5, symbol, demand_zones, max_positions=5):
             "comment": f"Buy order - {market_condition} market",
             "type_time": mt5.ORDER_TIME_GTC
         }
+        if orders is not None:
+            client_id = orders.submit(request, margin=margin_needed, created_ns=snapshot.created_ns)
+            print(f"Queued buy order {client_id} at {ask_price} ({market_condition} market, strength: {trend_strength:.2f})")
+            return True
         result = mt5.order_send(request)
+        METRICS.record("order.decision_to_order", time.perf_counter_ns() - snapshot.created_ns)
         if result.retcode != mt5.TRADE_RETCODE_DONE:
             print(f"Failed to open buy order. Retcode: {result.retcode}")
-        else:
-            print(f"Opened buy order at {ask_price} ({market_condition} market, strength: {trend_strength:.2f})")
+            return False
+        if risk is not None:
+            risk.add(result.order, symbol, mt5.ORDER_TYPE_BUY, volume, result.price or ask_price, sl_price)
+        print(f"Opened buy order at {ask_price} ({market_condition} market, strength: {trend_strength:.2f})")
+        return True
     else:
-        print(f"Waiting for better buy conditions. Market: {market_condition}, Strength: {trend_strength:.2f}")
\ No newline at end of file
+        print(f"Waiting for better buy conditions. Market: {market_condition}, Strength: {trend_strength:.2f}")
+        return False
@@ -0,0 +1,196 @@
+import argparse
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import numpy as np
+from bar_cache import parse_timeframe, timeframe_seconds
+
+# Record layout of MetaTrader5 copy_rates_* results
+RATES_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+    ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8'),
+])
+MAGIC = b"SDBARS\x00\x01"
+HEADER_SIZE = 16  # MAGIC + reserved
+IMPORT_CHUNK_DAYS = 30
+
+class _TimeColumn:
+    """Sequence view of a memmap's time field so bisect touches O(log n) records instead of the whole column"""
+    def __init__(self, records: np.ndarray):
+        self.records = records
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, i):
+        return int(self.records[i]['time'])
+
+def append_records(path: str, magic: bytes, records: np.ndarray) -> None:
+    """
+    Append fixed-width records to a file of `magic` + reserved header, writing the header first if
+    the file is new. A partial record left by a write a crash interrupted is cut off first, so every
+    record after it stays aligned.
+    """
+    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size < HEADER_SIZE:
+            f.seek(0)
+            f.truncate()
+            f.write(magic.ljust(HEADER_SIZE, b"\x00"))
+        else:
+            whole = HEADER_SIZE + (size - HEADER_SIZE) // records.dtype.itemsize * records.dtype.itemsize
+            if whole != size:
+                f.truncate(whole)
+                f.seek(whole)
+        f.write(records.tobytes())
+
+def _bisect_left(records: np.ndarray, t: int) -> int:
+    times = _TimeColumn(records)
+    lo, hi = 0, len(times)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if times[mid] < t:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+class HistoryStore:
+    """
+    Local bar history: one append-only file of fixed-width RATES_DTYPE records per symbol/timeframe,
+    sorted by time. Reads are numpy memmaps, so a range query only pages in the bars it returns.
+    Only closed bars are stored.
+    """
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, symbol: str, timeframe: int) -> str:
+        return os.path.join(self.root, f"{symbol}_{timeframe}.bin")
+
+    def read(self, symbol: str, timeframe: int) -> np.ndarray:
+        """All stored bars as a read-only memmap (empty array if none)"""
+        path = self.path(symbol, timeframe)
+        if not os.path.exists(path) or os.path.getsize(path) <= HEADER_SIZE:
+            return np.empty(0, dtype=RATES_DTYPE)
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a bar history file")
+        count = (os.path.getsize(path) - HEADER_SIZE) // RATES_DTYPE.itemsize
+        return np.memmap(path, dtype=RATES_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+    def range(self, symbol: str, timeframe: int, start: Optional[int] = None, end: Optional[int] = None) -> np.ndarray:
+        """Bars with start <= time < end (unix seconds), as a zero-copy memmap slice"""
+        records = self.read(symbol, timeframe)
+        lo = _bisect_left(records, start) if start is not None else 0
+        hi = _bisect_left(records, end) if end is not None else len(records)
+        return records[lo:hi]
+
+    def tail(self, symbol: str, timeframe: int, count: int) -> np.ndarray:
+        records = self.read(symbol, timeframe)
+        return records[max(0, len(records) - count):]
+
+    def last_time(self, symbol: str, timeframe: int) -> Optional[int]:
+        records = self.read(symbol, timeframe)
+        return int(records[-1]['time']) if len(records) else None
+
+    def append(self, symbol: str, timeframe: int, rates: np.ndarray) -> int:
+        """
+        Append closed bars newer than the last stored one. Returns the number written.
+        """
+        last_time = self.last_time(symbol, timeframe)
+        if last_time is not None:
+            rates = rates[rates['time'] > last_time]
+        if len(rates) == 0:
+            return 0
+        records = np.empty(len(rates), dtype=RATES_DTYPE)
+        for name in RATES_DTYPE.names:
+            records[name] = rates[name]
+        append_records(self.path(symbol, timeframe), MAGIC, records)
+        return len(records)
+
+def backfill(mt5, store: HistoryStore, symbol: str, timeframe: int, start: datetime,
+             end: Optional[datetime] = None) -> int:
+    """
+    Pull history from the terminal in chunks and append everything newer than what the store holds.
+    The newest bar returned by the terminal is still forming and is left out.
+    """
+    end = end or datetime.now(timezone.utc)
+    last_time = store.last_time(symbol, timeframe)
+    if last_time is not None:
+        start = max(start, datetime.fromtimestamp(last_time, timezone.utc))
+    written = 0
+    forming_cutoff = int(end.timestamp()) - timeframe_seconds(timeframe)
+    while start < end:
+        chunk_end = min(start + timedelta(days=IMPORT_CHUNK_DAYS), end)
+        rates = mt5.copy_rates_range(symbol, timeframe, start, chunk_end)
+        if rates is None:
+            print(f"Failed to get rates for {symbol}, error code: {mt5.last_error()}")
+            break
+        written += store.append(symbol, timeframe, rates[rates['time'] <= forming_cutoff])
+        start = chunk_end
+    return written
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Manage the local bar history store")
+    parser.add_argument("--root", default="history")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill_cmd = commands.add_parser("import", help="Backfill bars from the MetaTrader5 terminal")
+    backfill_cmd.add_argument("symbol")
+    backfill_cmd.add_argument("--timeframe", default="M15")
+    backfill_cmd.add_argument("--days", type=int, default=365, help="How far back to start when the store is empty")
+
+    cache_cmd = commands.add_parser("import-cache", help="Append closed bars from a BarCache .npy file")
+    cache_cmd.add_argument("symbol")
+    cache_cmd.add_argument("path")
+    cache_cmd.add_argument("--timeframe", default="M15")
+
+    zones_cmd = commands.add_parser("zones", help="Find supply/demand zones in the stored bars")
+    zones_cmd.add_argument("symbol")
+    zones_cmd.add_argument("--timeframe", default="M15")
+    zones_cmd.add_argument("--days", type=int, default=30, help="Lookback before the last stored bar")
+
+    info_cmd = commands.add_parser("info", help="Show what is stored for a symbol")
+    info_cmd.add_argument("symbol")
+    info_cmd.add_argument("--timeframe", default="M15")
+    args = parser.parse_args(argv)
+
+    store = HistoryStore(args.root)
+    timeframe = parse_timeframe(args.timeframe)
+    if args.command == "import":
+        from broker import LiveBroker
+        mt5 = LiveBroker()
+        if not mt5.initialize():
+            print("initialize() failed")
+            return
+        try:
+            start = datetime.now(timezone.utc) - timedelta(days=args.days)
+            print(f"Imported {backfill(mt5, store, args.symbol, timeframe, start)} bars")
+        finally:
+            mt5.shutdown()
+    elif args.command == "import-cache":
+        # The last cached bar is the forming one
+        print(f"Imported {store.append(args.symbol, timeframe, np.load(args.path)[:-1])} bars")
+    elif args.command == "zones":
+        from zones import find_zones_in_rates
+        last_time = store.last_time(args.symbol, timeframe)
+        if last_time is not None:
+            # Zones are found straight on the memmapped range, without loading the rest of the file
+            supply_zones, demand_zones = find_zones_in_rates(
+                store.range(args.symbol, timeframe, last_time - args.days * 24 * 3600))
+            print(f"{len(supply_zones)} supply / {len(demand_zones)} demand zones in the last {args.days} days")
+            for name, zones in (("supply", supply_zones), ("demand", demand_zones)):
+                if zones:
+                    print(f"Latest {name} zone: {zones[-1][1]} at {zones[-1][0]:%Y-%m-%d %H:%M}")
+
+    records = store.read(args.symbol, timeframe)
+    if len(records):
+        first = datetime.fromtimestamp(int(records[0]['time']), timezone.utc)
+        last = datetime.fromtimestamp(int(records[-1]['time']), timezone.utc)
+        print(f"{args.symbol} {args.timeframe}: {len(records)} bars from {first:%Y-%m-%d %H:%M} to {last:%Y-%m-%d %H:%M}")
+    else:
+        print(f"{args.symbol} {args.timeframe}: no bars stored")
+
+if __name__ == "__main__":
+    main()
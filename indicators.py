@@ -0,0 +1,241 @@
+import bisect
+from collections import deque
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+QUIET, NORMAL, SPIKE = "quiet", "normal", "spike"
+VOLATILITY_WINDOW = 960  # Closed bars the volatility percentiles are taken over (10 days of M15)
+SPIKE_PERCENTILE = 99.0  # A bar whose true range beats this share of the window is a spike
+QUIET_PERCENTILE = 10.0  # ATR at or below this percentile of its own recent values is quiet
+
+class EMA:
+    """
+    Streaming exponential moving average, same recursion as pandas ewm(span=span, adjust=False).
+    """
+    def __init__(self, span: int):
+        self.span = span
+        self.alpha = 2 / (span + 1)
+        self.value: Optional[float] = None
+
+    def update(self, x: float) -> float:
+        self.value = self.peek(x)
+        return self.value
+
+    def peek(self, x: float) -> float:
+        """Value after `x` without committing it (e.g. for the still-forming bar)"""
+        if self.value is None:
+            return float(x)
+        return self.value + self.alpha * (x - self.value)
+
+class WilderRSI:
+    """
+    Streaming RSI with Wilder smoothing: the first average is the simple mean of `period`
+    changes, after that avg = (avg * (period - 1) + change) / period.
+    Reads 50 until `period` changes have been seen.
+    """
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_close: Optional[float] = None
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.count = 0
+
+    def update(self, close: float) -> float:
+        self.prev_close, self.avg_gain, self.avg_loss, self.count = self._step(close)
+        return self._rsi(self.avg_gain, self.avg_loss, self.count)
+
+    def peek(self, close: float) -> float:
+        _, avg_gain, avg_loss, count = self._step(close)
+        return self._rsi(avg_gain, avg_loss, count)
+
+    @property
+    def value(self) -> float:
+        return self._rsi(self.avg_gain, self.avg_loss, self.count)
+
+    def _step(self, close: float):
+        if self.prev_close is None:
+            return float(close), 0.0, 0.0, 0
+        change = close - self.prev_close
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        count = self.count + 1
+        if count <= self.period:
+            # Still accumulating the first simple average
+            avg_gain = self.avg_gain + (gain - self.avg_gain) / count
+            avg_loss = self.avg_loss + (loss - self.avg_loss) / count
+        else:
+            avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+            avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+        return float(close), avg_gain, avg_loss, count
+
+    def _rsi(self, avg_gain: float, avg_loss: float, count: int) -> float:
+        if count < self.period:
+            return 50.0
+        if avg_loss == 0:
+            return 100.0 if avg_gain > 0 else 50.0
+        return 100 - 100 / (1 + avg_gain / avg_loss)
+
+class ATR:
+    """
+    Streaming Average True Range with Wilder smoothing, seeded with the mean of the first `period` true ranges.
+    The first bar's true range is its high - low. None until `period` bars have been seen.
+    """
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_close: Optional[float] = None
+        self.value: Optional[float] = None
+        self.count = 0
+        self._sum = 0.0
+
+    def true_range(self, high: float, low: float) -> float:
+        if self.prev_close is None:
+            return high - low
+        return max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+
+    def update(self, high: float, low: float, close: float) -> Optional[float]:
+        tr = self.true_range(high, low)
+        self.prev_close = float(close)
+        self.count += 1
+        if self.count < self.period:
+            self._sum += tr
+        elif self.count == self.period:
+            self.value = (self._sum + tr) / self.period
+        else:
+            self.value = (self.value * (self.period - 1) + tr) / self.period
+        return self.value
+
+class RollingPercentile:
+    """
+    Percentile rank among the last `window` values pushed. A sorted copy of the window is kept,
+    so a lookup is one bisect and a push is one insort plus one removal.
+    """
+    def __init__(self, window: int = VOLATILITY_WINDOW):
+        self.window = window
+        self._values = deque()
+        self._sorted = []
+
+    def __len__(self):
+        return len(self._values)
+
+    def push(self, x: float) -> None:
+        self._values.append(x)
+        bisect.insort(self._sorted, x)
+        if len(self._values) > self.window:
+            del self._sorted[bisect.bisect_left(self._sorted, self._values.popleft())]
+
+    def rank(self, x: float) -> float:
+        """Share of the window strictly below x, in percent"""
+        if not self._sorted:
+            return 50.0
+        return bisect.bisect_left(self._sorted, x) * 100 / len(self._sorted)
+
+class VolatilityRegime:
+    """
+    Classifies the forming bar as QUIET, NORMAL or SPIKE against the symbol's own recent bars,
+    so the same thresholds hold across pairs with different pip sizes and price levels.
+    SPIKE: the bar's true range so far beats SPIKE_PERCENTILE of the window's true ranges.
+    QUIET: the ATR sits at or below QUIET_PERCENTILE of its recent values.
+    Fed one closed bar at a time, like the other streaming indicators.
+    """
+    def __init__(self, atr_period: int = 14, window: int = VOLATILITY_WINDOW,
+                 spike_percentile: float = SPIKE_PERCENTILE, quiet_percentile: float = QUIET_PERCENTILE):
+        self.atr = ATR(atr_period)
+        self.ranges = RollingPercentile(window)
+        self.atrs = RollingPercentile(window)
+        self.spike_percentile = spike_percentile
+        self.quiet_percentile = quiet_percentile
+
+    def update(self, high: float, low: float, close: float) -> None:
+        self.ranges.push(self.atr.true_range(high, low))
+        if self.atr.update(high, low, close) is not None:
+            self.atrs.push(self.atr.value)
+
+    def classify(self, high: float, low: float) -> str:
+        """Regime for a bar (normally the forming one) with this high/low so far; NORMAL until warmed up"""
+        if self.atr.value is None:
+            return NORMAL
+        if self.ranges.rank(self.atr.true_range(high, low)) >= self.spike_percentile:
+            return SPIKE
+        if self.atrs.rank(self.atr.value) <= self.quiet_percentile:
+            return QUIET
+        return NORMAL
+
+def ema_series(values: np.ndarray, span: int) -> np.ndarray:
+    ema = EMA(span)
+    return np.array([ema.update(x) for x in values.tolist()])
+
+def rsi_series(closes: np.ndarray, period: int = 14) -> np.ndarray:
+    rsi = WilderRSI(period)
+    return np.array([rsi.update(x) for x in closes.tolist()])
+
+def volatility_series(highs: np.ndarray, lows: np.ndarray, closes: np.ndarray, atr_period: int = 14) -> np.ndarray:
+    """
+    VolatilityRegime.classify for every bar, as the live path sees it while that bar is forming:
+    each bar is classified against the bars before it, then fed in
+    """
+    regime = VolatilityRegime(atr_period)
+    result = []
+    for h, l, c in zip(highs.tolist(), lows.tolist(), closes.tolist()):
+        result.append(regime.classify(h, l))
+        regime.update(h, l, c)
+    return np.array(result)
+
+def atr_series(highs: np.ndarray, lows: np.ndarray, closes: np.ndarray, period: int = 14) -> np.ndarray:
+    """NaN until the first full period"""
+    atr = ATR(period)
+    values = [atr.update(h, l, c) for h, l, c in zip(highs.tolist(), lows.tolist(), closes.tolist())]
+    return np.array([np.nan if v is None else v for v in values])
+
+class IndicatorState:
+    """
+    EMA fast/slow, RSI, ATR and the volatility regime for one symbol/timeframe.
+    Seeded once from the cached history and then advanced by each newly closed bar
+    (O(1), plus the regime's sorted-window upkeep).
+    """
+    def __init__(self, fast_span: int = 20, slow_span: int = 50, rsi_period: int = 14, atr_period: int = 14):
+        self._params = (fast_span, slow_span, rsi_period, atr_period)
+        self._reset()
+
+    def _reset(self) -> None:
+        fast_span, slow_span, rsi_period, atr_period = self._params
+        self.ema_fast = EMA(fast_span)
+        self.ema_slow = EMA(slow_span)
+        self.rsi = WilderRSI(rsi_period)
+        self.volatility = VolatilityRegime(atr_period)
+        self.atr = self.volatility.atr
+        self.last_time: Optional[int] = None
+
+    def update(self, rates: np.ndarray) -> int:
+        """
+        Feed the closed bars of `rates` (newest bar last, still forming) not seen yet.
+        A series that no longer overlaps what was seen (a data gap) reseeds from scratch.
+        Returns the number of bars consumed.
+        """
+        if self.last_time is not None and (len(rates) == 0 or rates['time'][0] > self.last_time):
+            self._reset()
+        closed = rates[:-1]
+        if self.last_time is not None:
+            closed = closed[closed['time'] > self.last_time]
+        for high, low, close in zip(closed['high'].tolist(), closed['low'].tolist(), closed['close'].tolist()):
+            self.ema_fast.update(close)
+            self.ema_slow.update(close)
+            self.rsi.update(close)
+            self.volatility.update(high, low, close)
+        if len(closed):
+            self.last_time = int(closed['time'][-1])
+        return len(closed)
+
+    def market_inputs(self, forming_close: float) -> Tuple[float, float, float]:
+        """(ema_fast, ema_slow, rsi) including the forming bar's current close"""
+        return self.ema_fast.peek(forming_close), self.ema_slow.peek(forming_close), self.rsi.peek(forming_close)
+
+class IndicatorRegistry:
+    """IndicatorState per (symbol, timeframe), kept for the life of the bot"""
+    def __init__(self, **params):
+        self._params = params
+        self._states: Dict[Tuple[str, int], IndicatorState] = {}
+
+    def get(self, symbol: str, timeframe: int) -> IndicatorState:
+        key = (symbol, timeframe)
+        if key not in self._states:
+            self._states[key] = IndicatorState(**self._params)
+        return self._states[key]
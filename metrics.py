@@ -0,0 +1,213 @@
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+if TYPE_CHECKING:
+    # http.server is imported by serve() only, so the trading path does not load it
+    from http.server import ThreadingHTTPServer
+
+class Histogram:
+    """
+    Log-linear latency histogram in nanoseconds: 8 buckets per doubling, so a percentile is
+    within 12.5% of the true value. Recording is a few integer operations and a counter
+    increment, and memory stays fixed however many values are recorded.
+    """
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def bucket(ns: int) -> int:
+        shift = ns.bit_length() - 4
+        if shift <= 0:
+            return max(ns, 0)
+        # The top 4 bits (8..15) pick the sub-bucket within the doubling
+        return (shift << 3) + (ns >> shift)
+
+    @staticmethod
+    def bucket_upper(bucket: int) -> int:
+        if bucket < 16:
+            return bucket + 1
+        return ((bucket & 7) + 9) << ((bucket >> 3) - 1)
+
+    def record(self, ns: int) -> None:
+        bucket = self.bucket(ns)
+        with self._lock:
+            self.counts[bucket] = self.counts.get(bucket, 0) + 1
+            self.count += 1
+            self.total += ns
+            if ns > self.max:
+                self.max = ns
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (0-100), in nanoseconds"""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = max(1, math.ceil(self.count * q / 100))
+            seen = 0
+            for bucket in sorted(self.counts):
+                seen += self.counts[bucket]
+                if seen >= rank:
+                    return float(min(self.bucket_upper(bucket), self.max))
+        return float(self.max)
+
+    def summary(self) -> Dict[str, float]:
+        """Count and milliseconds"""
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count / 1e6 if self.count else 0.0,
+            "p50_ms": self.percentile(50) / 1e6,
+            "p99_ms": self.percentile(99) / 1e6,
+            "max_ms": self.max / 1e6,
+        }
+
+class Timer:
+    """Context manager recording the time spent inside it"""
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter_ns() - self.start)
+
+class Metrics:
+    """Named histograms for cycle stages, broker calls and order latency"""
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    def record(self, name: str, ns: int) -> None:
+        self.histogram(name).record(ns)
+
+    def timer(self, name: str) -> "Timer":
+        """Time a with-block into histogram `name`"""
+        return Timer(self.histogram(name))
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "uptime_s": time.time() - self.started,
+            "histograms": {name: h.summary() for name, h in sorted(self.histograms.items())},
+        }
+
+    def write(self, path: str) -> None:
+        """Write the snapshot as JSON, replacing the file atomically"""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.snapshot(), f, indent=1)
+        os.replace(tmp, path)
+
+    def report(self) -> str:
+        lines = [f"{'name':<32} {'count':>8} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+        for name, s in self.snapshot()["histograms"].items():
+            lines.append(f"{name:<32} {s['count']:>8} {s['p50_ms']:>9.3f} {s['p99_ms']:>9.3f} {s['max_ms']:>9.3f}")
+        return "\n".join(lines)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> "ThreadingHTTPServer":
+        """
+        Serve the snapshot on a daemon thread: GET /metrics for JSON, /metrics.txt for the table,
+        /profile?seconds=N for N seconds of folded stacks from the running bot (see SamplingProfiler)
+        """
+        # http.server pulls in email and http.client; only pay for them when the endpoint is enabled
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/metrics":
+                    body, content_type = json.dumps(metrics.snapshot()), "application/json"
+                elif url.path == "/metrics.txt":
+                    body, content_type = metrics.report(), "text/plain"
+                elif url.path == "/profile":
+                    seconds = float(parse_qs(url.query).get("seconds", ["10"])[0])
+                    body, content_type = SamplingProfiler().run_for(min(seconds, 300)), "text/plain"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every other thread every `interval` seconds and counts them in folded
+    form ("outer;inner;leaf count" per line), the input flamegraph.pl and speedscope take.
+    Only the sampling thread does any work, so the bot itself runs unmodified.
+    """
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.folded()
+
+    def run_for(self, seconds: float) -> str:
+        self.start()
+        time.sleep(seconds)
+        return self.stop()
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def _sample(self) -> None:
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+# Process-wide registry the bot records into
+METRICS = Metrics()
@@ -0,0 +1,182 @@
+import argparse
+import contextlib
+import csv
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, Iterator, List, Optional
+import numpy as np
+from bar_cache import parse_timeframe
+from backtest import Backtester, BacktestResult, Features, load_rates, load_store_range
+from execute_trades import StrategyParams
+
+# Values swept when no --param is given
+DEFAULT_SPACE = {
+    "sl_pips": [60, 80, 100, 150],
+    "risk_reward": [1.0, 1.5, 2.0, 3.0],
+    "trend_threshold": [0.25, 0.5, 1.0],
+    "max_positions": [1, 3, 5],
+    "risk_percent": [0.5, 1.0],
+    "ema_fast": [10, 20],
+    "ema_slow": [50, 100],
+    "lookback_days": [15, 30, 60],
+}
+
+RANK_METRICS = ("return_pct", "profit_factor", "win_rate", "calmar")
+
+# Per-process state set up by _init_worker
+_worker: Dict[str, object] = {}
+
+def grid(space: Dict[str, list]) -> List[Dict[str, float]]:
+    """Every combination in the space"""
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+def random_combinations(space: Dict[str, list], samples: int, seed: int = 0) -> List[Dict[str, float]]:
+    """`samples` distinct random combinations (fewer if the space is smaller)"""
+    rng = random.Random(seed)
+    names = list(space)
+    total = 1
+    for name in names:
+        total *= len(space[name])
+    seen = set()
+    while len(seen) < min(samples, total):
+        seen.add(tuple(rng.randrange(len(space[name])) for name in names))
+    return [{name: space[name][i] for name, i in zip(names, picks)} for picks in sorted(seen)]
+
+def _init_worker(series: Dict[str, tuple], backtester_kwargs: dict) -> None:
+    # Pool workers share the parent's resource tracker, so attaching here does not take ownership
+    _worker["shm"] = []
+    _worker["rates"] = {}
+    for symbol, (shm_name, shape, dtype) in series.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker["shm"].append(shm)  # Keep the mappings alive for the life of the worker
+        _worker["rates"][symbol] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _worker["features"] = {}
+    _worker["backtester_kwargs"] = backtester_kwargs
+
+@contextlib.contextmanager
+def backtest_pool(series: Dict[str, np.ndarray], workers: Optional[int] = None,
+                  **backtester_kwargs) -> Iterator[ProcessPoolExecutor]:
+    """
+    Process pool for backtest_in_worker calls on the bars in `series` (by symbol).
+    The bars are placed in shared memory once; workers map them instead of receiving a copy.
+    """
+    shms = []
+    try:
+        shared = {}
+        for symbol, rates in series.items():
+            shm = shared_memory.SharedMemory(create=True, size=max(rates.nbytes, 1))
+            shms.append(shm)
+            np.ndarray(rates.shape, dtype=rates.dtype, buffer=shm.buf)[:] = rates
+            shared[symbol] = (shm.name, rates.shape, rates.dtype)
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                                 initargs=(shared, backtester_kwargs)) as pool:
+            yield pool
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+def backtest_in_worker(symbol: str, combination: Dict[str, float], start: int = 0,
+                       end: Optional[int] = None) -> BacktestResult:
+    """Backtest one combination on a backtest_pool worker's bars for `symbol`"""
+    rates = _worker["rates"][symbol]
+    features = _worker["features"].get(symbol)
+    if features is None:
+        # One Features per symbol and worker, so zones and EMAs are reused across combinations
+        features = _worker["features"][symbol] = Features(rates)
+    backtester = Backtester(params=StrategyParams(**combination), **_worker["backtester_kwargs"])
+    return backtester.run(rates, features=features, start=start, end=end)
+
+def _evaluate(combination: Dict[str, float]) -> Dict[str, float]:
+    return {**combination, **backtest_in_worker("", combination).summary()}
+
+def optimize(rates: np.ndarray, combinations: Iterable[Dict[str, float]], workers: Optional[int] = None,
+             rank_by: str = "return_pct", **backtester_kwargs) -> List[Dict[str, float]]:
+    """
+    Backtest every parameter combination on a process pool and return the rows ranked best first.
+    Workers map the bars from shared memory and each keeps one Features instance (see backtest_pool).
+    """
+    # Combinations sharing a lookback and EMA spans run back to back so workers hit their cached zones and indicators
+    combinations = sorted(combinations, key=lambda c: (c.get("lookback_days", 0), c.get("ema_fast", 0),
+                                                       c.get("ema_slow", 0)))
+    workers = workers or os.cpu_count()
+    chunksize = max(1, len(combinations) // (workers * 4))
+    # One unnamed series; _evaluate backtests it under the same "" key
+    with backtest_pool({"": rates}, workers, **backtester_kwargs) as pool:
+        rows = list(pool.map(_evaluate, combinations, chunksize=chunksize))
+    return sorted(rows, key=lambda row: row[rank_by], reverse=True)
+
+def write_results(rows: List[Dict[str, float]], path: str) -> None:
+    if not rows:
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["rank", *rows[0]])
+        writer.writeheader()
+        for rank, row in enumerate(rows, 1):
+            writer.writerow({"rank": rank, **row})
+
+def parse_space(specs: List[str], fixed_news_threshold: bool = False) -> Dict[str, list]:
+    """
+    --param name=v1,v2,... entries; anything not given keeps its live default.
+    impact_threshold_pips only takes effect with the fixed news threshold, so it is refused without it.
+    """
+    space = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        if name not in StrategyParams.FIELDS:
+            raise ValueError(f"Unknown parameter {name!r}, expected one of {', '.join(StrategyParams.FIELDS)}")
+        if name == "impact_threshold_pips" and not fixed_news_threshold:
+            raise ValueError("impact_threshold_pips is ignored by the volatility-regime news filter; "
+                             "pass --fixed-news-threshold to sweep it")
+        space[name] = [float(v) if "." in v else int(v) for v in values.split(",")]
+    return space
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Sweep strategy parameters over cached bars")
+    parser.add_argument("symbol")
+    parser.add_argument("--timeframe", type=parse_timeframe, default="M15")
+    parser.add_argument("--cache-dir", default="bar_cache")
+    parser.add_argument("--store", help="Read bars from this HistoryStore directory instead of the cache")
+    parser.add_argument("--start", help="First day to replay (YYYY-MM-DD, store only)")
+    parser.add_argument("--end", help="Day to stop before (YYYY-MM-DD, store only)")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=V1,V2",
+                        help="Values to sweep for one parameter; repeat for several (default: a built-in space)")
+    parser.add_argument("--random", type=int, metavar="N", help="Sample N random combinations instead of the full grid")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rank-by", choices=RANK_METRICS, default="return_pct")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--point", type=float, default=0.00001)
+    parser.add_argument("--tick-value", type=float, default=1.0)
+    parser.add_argument("--fixed-news-threshold", action="store_true",
+                        help="Skip bars on the old fixed open-close threshold (impact_threshold_pips) "
+                             "instead of the volatility regime")
+    parser.add_argument("--out", default="optimize_results.csv")
+    args = parser.parse_args(argv)
+
+    if args.store:
+        rates = load_store_range(args.store, args.symbol, args.timeframe, args.start, args.end)
+    else:
+        rates = load_rates(os.path.join(args.cache_dir, f"{args.symbol}_{args.timeframe}.npy"))
+    space = parse_space(args.param, args.fixed_news_threshold) if args.param else DEFAULT_SPACE
+    combinations = random_combinations(space, args.random, args.seed) if args.random else grid(space)
+
+    started = time.perf_counter()
+    rows = optimize(rates, combinations, workers=args.workers, rank_by=args.rank_by,
+                    point=args.point, tick_value=args.tick_value,
+                    use_volatility_regime=not args.fixed_news_threshold)
+    elapsed = time.perf_counter() - started
+    write_results(rows, args.out)
+
+    print(f"{len(rows)} backtests over {len(rates)} bars in {elapsed:.1f}s ({len(rows) / elapsed:.1f}/s)")
+    for rank, row in enumerate(rows[:5], 1):
+        params = ", ".join(f"{name}={row[name]}" for name in space)
+        print(f"#{rank} {args.rank_by}={row[args.rank_by]:.2f} trades={row['trades']} - {params}")
+    print(f"Ranked results written to {args.out}")
+
+if __name__ == "__main__":
+    main()
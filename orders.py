@@ -0,0 +1,194 @@
+import itertools
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+from broker import TradePosition
+from metrics import METRICS
+
+# Terminal answers that mean "price moved, send again at the current price"
+RETRY_RETCODES = (10004, 10020, 10021)  # TRADE_RETCODE_REQUOTE, PRICE_CHANGED, PRICE_OFF
+MAX_ATTEMPTS = 3
+RECONCILE_INTERVAL = 5.0  # Seconds between position syncs with the terminal while idle
+COMMENT_LENGTH = 31  # MT5 truncates longer order comments
+
+PENDING, FILLED, FAILED = "pending", "filled", "failed"
+
+class OrderRecord:
+    """One submitted order from queueing until the terminal's position list shows it"""
+    def __init__(self, client_id: str, request: dict, margin: float, created_ns: int):
+        self.client_id = client_id
+        self.request = request
+        self.margin = margin
+        self.created_ns = created_ns
+        self.state = PENDING
+        self.ticket = 0
+        self.retcode = None
+        self.attempts = 0
+        self.filled_at = 0.0
+
+    def as_position(self) -> TradePosition:
+        """Stand-in for the position this order opens, so duplicate/limit checks count it already"""
+        request = self.request
+        return TradePosition(self.ticket, 0, request["type"], request.get("magic", 0), self.ticket,
+                             request["volume"], request["price"], request.get("sl", 0.0), request.get("tp", 0.0),
+                             request["price"], 0.0, request["symbol"], request.get("comment", ""))
+
+def client_id_of(comment: str) -> str:
+    return comment.split(" ", 1)[0] if comment else ""
+
+class OrderManager:
+    """
+    Order queue with one executor thread, so deciding to trade never waits on order_send.
+    Every order gets a client id written at the start of its comment. If the terminal's answer
+    is lost, the executor looks for a position carrying that id before sending again, so one
+    decision can never open two positions. Requotes are re-sent at the current price with
+    SL/TP shifted by the same amount, up to MAX_ATTEMPTS sends.
+    positions() is a local book: the terminal's positions as of the last reconcile plus orders
+    still in flight. The executor re-syncs it whenever it is idle, and keeps a RiskEngine given
+    as `risk` in step with it.
+    """
+    def __init__(self, mt5, reconcile_interval: float = RECONCILE_INTERVAL, max_attempts: int = MAX_ATTEMPTS,
+                 risk=None):
+        self.mt5 = mt5
+        self.risk = risk
+        self.reconcile_interval = reconcile_interval
+        self.max_attempts = max_attempts
+        self._prefix = f"sd{int(time.time()) % 36 ** 5:x}-"
+        self._ids = itertools.count(1)
+        self._queue: "queue.Queue[Optional[OrderRecord]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, OrderRecord] = {}
+        self._open: Dict[int, TradePosition] = {}
+        self.reconcile()
+        self._thread = threading.Thread(target=self._run, name="order-executor", daemon=True)
+        self._thread.start()
+
+    def submit(self, request: dict, margin: float = 0.0, created_ns: Optional[int] = None) -> str:
+        """Queue a TRADE_ACTION_DEAL request and return its client id immediately"""
+        client_id = f"{self._prefix}{next(self._ids)}"
+        request = dict(request, comment=f"{client_id} {request.get('comment', '')}"[:COMMENT_LENGTH].rstrip())
+        record = OrderRecord(client_id, request, margin, created_ns or time.perf_counter_ns())
+        with self._lock:
+            self._in_flight[client_id] = record
+        if self.risk is not None:
+            self.risk.add(client_id, request["symbol"], request["type"], request["volume"], request["price"],
+                          request.get("sl", 0.0))
+        self._queue.put(record)
+        return client_id
+
+    def positions(self, symbol: Optional[str] = None) -> List[TradePosition]:
+        """Open positions from the last reconcile plus the orders still in flight"""
+        with self._lock:
+            book = [pos for pos in self._open.values() if symbol is None or pos.symbol == symbol]
+            known = {pos.ticket for pos in book}
+            for record in self._in_flight.values():
+                if symbol is not None and record.request["symbol"] != symbol:
+                    continue
+                if record.ticket not in known:
+                    book.append(record.as_position())
+        return book
+
+    def pending_margin(self) -> float:
+        """Margin of orders the terminal has not confirmed yet, which account_info().margin_free does not reflect"""
+        with self._lock:
+            return sum(record.margin for record in self._in_flight.values() if record.state == PENDING)
+
+    def record(self, client_id: str) -> Optional[OrderRecord]:
+        with self._lock:
+            return self._in_flight.get(client_id)
+
+    def reconcile(self) -> bool:
+        """Replace the book with the terminal's positions; filled orders it now shows leave the in-flight list"""
+        started = time.monotonic()
+        positions = self.mt5.positions_get()
+        if positions is None:
+            return False
+        with self._lock:
+            self._open = {pos.ticket: pos for pos in positions}
+            settled = [client_id for client_id, record in self._in_flight.items()
+                       # A fill older than this snapshot is either listed now or already closed again
+                       if record.state == FILLED and record.filled_at < started]
+            for client_id in settled:
+                del self._in_flight[client_id]
+        if self.risk is not None:
+            self.risk.update_positions(positions)
+            for client_id in settled:
+                self.risk.remove(client_id)
+        return True
+
+    def wait(self) -> None:
+        """Block until every queued order has been sent (for tests and shutdown)"""
+        self._queue.join()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                record = self._queue.get(timeout=self.reconcile_interval)
+            except queue.Empty:
+                self.reconcile()
+                continue
+            if record is None:
+                self._queue.task_done()
+                return
+            try:
+                self._execute(record)
+            except Exception as e:
+                print(f"Order {record.client_id} failed: {e}")
+                self._finish(record, FAILED)
+            finally:
+                self._queue.task_done()
+            if self._queue.empty():
+                self.reconcile()
+
+    def _execute(self, record: OrderRecord) -> None:
+        mt5, request = self.mt5, record.request
+        while record.attempts < self.max_attempts:
+            record.attempts += 1
+            result = mt5.order_send(request)
+            if result is None:
+                # The answer was lost - the order may still have gone through
+                existing = self._find_position(record.client_id)
+                if existing is not None:
+                    record.ticket = existing.ticket
+                    self._finish(record, FILLED)
+                    return
+                continue
+            record.retcode = result.retcode
+            if result.retcode == mt5.TRADE_RETCODE_DONE:
+                record.ticket = result.order
+                print(f"Order {record.client_id} filled at {result.price} (ticket {result.order})")
+                self._finish(record, FILLED)
+                return
+            if result.retcode not in RETRY_RETCODES:
+                break
+            tick = mt5.symbol_info_tick(request["symbol"])
+            if tick is None:
+                break
+            price = tick.ask if request["type"] == mt5.ORDER_TYPE_BUY else tick.bid
+            shift = price - request["price"]
+            request["price"] = price
+            for level in ("sl", "tp"):
+                if request.get(level):
+                    request[level] += shift
+        print(f"Order {record.client_id} failed after {record.attempts} attempt(s). Retcode: {record.retcode}")
+        self._finish(record, FAILED)
+
+    def _find_position(self, client_id: str) -> Optional[TradePosition]:
+        positions = self.mt5.positions_get(symbol=self.record(client_id).request["symbol"]) or ()
+        return next((pos for pos in positions if client_id_of(pos.comment) == client_id), None)
+
+    def _finish(self, record: OrderRecord, state: str) -> None:
+        with self._lock:
+            record.state = state
+            if state == FILLED:
+                record.filled_at = time.monotonic()
+                METRICS.record("order.decision_to_order", time.perf_counter_ns() - record.created_ns)
+            else:
+                self._in_flight.pop(record.client_id, None)
+        if state == FAILED and self.risk is not None:
+            self.risk.remove(record.client_id)
@@ -0,0 +1,184 @@
+import threading
+from typing import Dict, Iterable, Optional
+from broker import AccountInfo
+
+MAX_TOTAL_RISK_PERCENT = 10.0  # Summed stop-loss risk of open positions and in-flight orders, % of equity
+MAX_CURRENCY_EXPOSURE = 30.0  # Net notional per currency, as a multiple of equity
+
+class PositionRisk:
+    """What one position or in-flight order adds to the portfolio totals, in account currency"""
+    def __init__(self, symbol: str, direction: int, notional: float, margin: float, risk: float,
+                 base: str, quote: str, profit: float = 0.0):
+        self.symbol = symbol
+        self.direction = direction
+        self.notional = notional
+        self.margin = margin
+        self.risk = risk
+        self.base = base
+        self.quote = quote
+        self.profit = profit
+
+class RiskEngine:
+    """
+    Portfolio-wide view of risk, kept locally so an order decision needs no broker round-trips.
+    Contract specs are read once per symbol and session. Margin, stop-loss risk and net
+    exposure per currency are running totals, adjusted as positions and in-flight orders are
+    added and removed, so check() is a fixed handful of dict lookups however many symbols trade.
+    Margin is computed locally with the forex formula (notional / account leverage). Account
+    equity is the last balance plus the positions' floating profit; the balance is re-read
+    from the terminal only when a position closes. If the first sync fails it is retried on the
+    next call that needs account data, so one failed read does not refuse orders for the session.
+    """
+    def __init__(self, mt5, max_total_risk_percent: float = MAX_TOTAL_RISK_PERCENT,
+                 max_currency_exposure: float = MAX_CURRENCY_EXPOSURE):
+        self.mt5 = mt5
+        self.max_total_risk_percent = max_total_risk_percent
+        self.max_currency_exposure = max_currency_exposure
+        self._lock = threading.Lock()
+        self._specs: Dict[str, object] = {}
+        self._account = None
+        self._entries: Dict[object, PositionRisk] = {}
+        self.margin = 0.0
+        self.risk = 0.0
+        self.floating = 0.0
+        self.exposure: Dict[str, float] = {}
+        self.sync()
+
+    def sync(self) -> bool:
+        """Rebuild everything from the terminal: account and all open positions"""
+        account = self.mt5.account_info()
+        positions = self.mt5.positions_get()
+        if account is None or positions is None:
+            print(f"Risk engine could not read the account, error code: {self.mt5.last_error()}")
+            return False
+        with self._lock:
+            self._account = account
+            self._entries = {}
+            self.margin = self.risk = self.floating = 0.0
+            self.exposure = {}
+        self.update_positions(positions)
+        return True
+
+    def spec(self, symbol: str):
+        """symbol_info() for `symbol`, read from the terminal once per session"""
+        spec = self._specs.get(symbol)
+        if spec is None:
+            spec = self.mt5.symbol_info(symbol)
+            if spec is not None:
+                self._specs[symbol] = spec
+        return spec
+
+    def account_info(self) -> Optional[AccountInfo]:
+        """account_info() as tracked locally"""
+        if not self._ready():
+            return None
+        account = self._account
+        with self._lock:
+            equity = account.balance + self.floating
+            margin = self.margin
+        return AccountInfo(account.login, account.balance, equity, equity - account.balance, margin, equity - margin,
+                           equity / margin * 100 if margin else 0.0, account.leverage, account.currency)
+
+    def margin_for(self, symbol: str, volume: float, price: float) -> Optional[float]:
+        """Local order_calc_margin()"""
+        spec = self.spec(symbol)
+        if spec is None or not self._ready():
+            return None
+        return self._notional(spec, volume, price) / self._account.leverage
+
+    def check(self, symbol: str, order_type: int, volume: float, price: float, sl: float = 0.0) -> Optional[str]:
+        """Reason the order would break a limit, or None if it may be placed"""
+        if not self._ready():
+            return "no account data"
+        entry = self._entry(symbol, order_type, volume, price, sl)
+        account = self.account_info()
+        if entry is None or account is None:
+            return "no contract or account data"
+        equity = account.equity
+        with self._lock:
+            if account.margin_free < entry.margin:
+                return f"margin {entry.margin:.2f} exceeds free margin {account.margin_free:.2f}"
+            if self.risk + entry.risk > equity * self.max_total_risk_percent / 100:
+                return f"total risk {self.risk + entry.risk:.2f} over {self.max_total_risk_percent}% of equity"
+            limit = equity * self.max_currency_exposure
+            for currency, delta in ((entry.base, entry.direction * entry.notional),
+                                    (entry.quote, -entry.direction * entry.notional)):
+                current = self.exposure.get(currency, 0.0)
+                # Orders that reduce a currency's exposure are always allowed
+                if abs(current + delta) > limit and abs(current + delta) > abs(current):
+                    return f"{currency} exposure {current + delta:.0f} over {self.max_currency_exposure}x equity"
+        return None
+
+    def add(self, key, symbol: str, order_type: int, volume: float, price: float, sl: float = 0.0,
+            profit: float = 0.0) -> None:
+        """Count a position (keyed by ticket) or an in-flight order (keyed by client id)"""
+        entry = self._entry(symbol, order_type, volume, price, sl, profit)
+        if entry is None:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._apply(previous, -1)
+            self._entries[key] = entry
+            self._apply(entry, 1)
+
+    def remove(self, key) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._apply(entry, -1)
+
+    def update_positions(self, positions: Iterable, symbol: Optional[str] = None) -> None:
+        """
+        Apply a positions_get() result (for `symbol` only, when given): new tickets are added,
+        floating profit is updated, and tickets no longer listed are removed, which re-reads the balance.
+        """
+        listed = set()
+        added = []
+        with self._lock:
+            for pos in positions:
+                listed.add(pos.ticket)
+                entry = self._entries.get(pos.ticket)
+                if entry is None:
+                    added.append(pos)
+                else:
+                    self.floating += pos.profit - entry.profit
+                    entry.profit = pos.profit
+            closed = [key for key, entry in self._entries.items()
+                      if isinstance(key, int) and key not in listed and (symbol is None or entry.symbol == symbol)]
+        for pos in added:
+            self.add(pos.ticket, pos.symbol, pos.type, pos.volume, pos.price_open, pos.sl, pos.profit)
+        for key in closed:
+            self.remove(key)
+        if closed:
+            account = self.mt5.account_info()
+            if account is not None:
+                self._account = account
+
+    def _ready(self) -> bool:
+        """True once account data is in, syncing first if it never was"""
+        return self._account is not None or self.sync()
+
+    def _notional(self, spec, volume: float, price: float) -> float:
+        # tick_value / tick_size converts a price move in the quote currency to account currency per lot
+        return volume * price * spec.trade_tick_value / spec.trade_tick_size
+
+    def _entry(self, symbol: str, order_type: int, volume: float, price: float, sl: float = 0.0,
+               profit: float = 0.0) -> Optional[PositionRisk]:
+        spec = self.spec(symbol)
+        if spec is None or not self._ready():
+            return None
+        notional = self._notional(spec, volume, price)
+        # Without a stop the whole notional is at risk
+        risk = abs(price - sl) / spec.trade_tick_size * spec.trade_tick_value * volume if sl else notional
+        direction = 1 if order_type == self.mt5.ORDER_TYPE_BUY else -1
+        return PositionRisk(symbol, direction, notional, notional / self._account.leverage, risk,
+                            spec.currency_base, spec.currency_profit, profit)
+
+    def _apply(self, entry: PositionRisk, sign: int) -> None:
+        self.margin += sign * entry.margin
+        self.risk += sign * entry.risk
+        self.floating += sign * entry.profit
+        flow = sign * entry.direction * entry.notional
+        self.exposure[entry.base] = self.exposure.get(entry.base, 0.0) + flow
+        self.exposure[entry.quote] = self.exposure.get(entry.quote, 0.0) - flow
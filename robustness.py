@@ -0,0 +1,239 @@
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import as_completed
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from bar_cache import parse_timeframe
+from backtest import BacktestResult, load_rates, load_store_range
+from optimize import (DEFAULT_SPACE, RANK_METRICS, backtest_in_worker, backtest_pool, grid, parse_space,
+                      random_combinations)
+
+TRAIN_MONTHS = 6
+TEST_MONTHS = 1
+MC_SIMULATIONS = 10000
+MC_CHUNK = 1000  # Simulated paths per pool task
+TASK_BATCH = 16  # Backtests per pool task, so per-task overhead stays small next to the replays
+QUANTILES = (5, 50, 95, 99)
+
+def month_windows(rates: np.ndarray, train_months: int = TRAIN_MONTHS,
+                  test_months: int = TEST_MONTHS) -> List[Tuple[int, int, int]]:
+    """
+    Rolling (train_start, test_start, test_end) bar indices: optimize on `train_months` calendar
+    months (UTC), test on the `test_months` after them, then roll forward by `test_months`.
+    The last test window may be a partial month.
+    """
+    if len(rates) == 0:
+        return []
+    months = rates['time'].astype('datetime64[s]').astype('datetime64[M]')
+    starts = np.flatnonzero(np.concatenate([[True], months[1:] != months[:-1]]))
+    bounds = [*starts.tolist(), len(rates)]
+    windows = []
+    for i in range(train_months, len(bounds) - 1, test_months):
+        windows.append((bounds[i - train_months], bounds[i], bounds[min(i + test_months, len(bounds) - 1)]))
+    return windows
+
+def trade_returns(result: BacktestResult) -> np.ndarray:
+    """Each closed trade's profit as a fraction of the balance before it, in exit order"""
+    trades = np.sort(result.trades, order='exit_index')
+    profits = trades['profit']
+    balance_before = result.initial_balance + np.concatenate([[0.0], np.cumsum(profits)[:-1]])
+    return profits / balance_before
+
+def monte_carlo(returns: np.ndarray, paths: int, seed, bootstrap: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (return_pct, max_drawdown_pct) of `paths` compounded equity curves built by resampling the trade
+    returns: with replacement when `bootstrap`, otherwise as shuffled orderings of the same trades.
+    """
+    rng = np.random.default_rng(seed)
+    if len(returns) == 0:
+        return np.zeros(paths), np.zeros(paths)
+    if bootstrap:
+        sampled = returns[rng.integers(0, len(returns), (paths, len(returns)))]
+    else:
+        sampled = rng.permuted(np.tile(returns, (paths, 1)), axis=1)
+    growth = np.cumprod(1 + sampled, axis=1)
+    peak = np.maximum(np.maximum.accumulate(growth, axis=1), 1.0)  # The starting balance is the first peak
+    drawdown = (1 - growth / peak).max(axis=1)
+    return (growth[:, -1] - 1) * 100, drawdown * 100
+
+def _train(tasks: List[tuple]) -> List[Dict[str, float]]:
+    return [{"symbol": symbol, "window": window, **combination,
+             **backtest_in_worker(symbol, combination, start, end).summary()}
+            for symbol, window, combination, start, end in tasks]
+
+def _test(task: tuple) -> Tuple[Dict[str, float], np.ndarray]:
+    symbol, window, combination, start, end = task
+    result = backtest_in_worker(symbol, combination, start, end)
+    return {"symbol": symbol, "window": window, **combination, **result.summary()}, trade_returns(result)
+
+def _simulate(task: tuple) -> Tuple[str, int, np.ndarray, np.ndarray]:
+    symbol, first, returns, paths, seed, bootstrap = task
+    return (symbol, first, *monte_carlo(returns, paths, seed, bootstrap))
+
+class CsvStream:
+    """Rows appended and flushed as they arrive, so a long study leaves usable output if interrupted"""
+    def __init__(self, path: str):
+        self._file = open(path, "w", newline="")
+        self._writer = None
+
+    def write(self, rows: Iterable[Dict[str, object]]) -> None:
+        for row in rows:
+            if self._writer is None:
+                self._writer = csv.DictWriter(self._file, fieldnames=list(row))
+                self._writer.writeheader()
+            self._writer.writerow(row)
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+def _batches(items: List, size: int) -> Iterator[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _date(rates: np.ndarray, index: int) -> str:
+    return str(np.datetime64(int(rates['time'][min(index, len(rates) - 1)]), 's').astype('datetime64[D]'))
+
+def analyze(series: Dict[str, np.ndarray], combinations: List[Dict[str, float]], out_dir: str,
+            train_months: int = TRAIN_MONTHS, test_months: int = TEST_MONTHS, rank_by: str = "return_pct",
+            simulations: int = MC_SIMULATIONS, bootstrap: bool = True, seed: int = 0,
+            workers: Optional[int] = None, **backtester_kwargs) -> Dict[str, Dict[str, float]]:
+    """
+    Walk-forward optimization then Monte Carlo, for every symbol in `series`, on one process pool.
+    1. Every combination is backtested on every training window (train.csv).
+    2. The best one per window by `rank_by` is replayed on the following test window (walk_forward.csv).
+    3. The out-of-sample trades of all test windows are resampled `simulations` times into
+       return/drawdown distributions (monte_carlo.csv).
+    Bars go to shared memory once (see backtest_pool), and results are written as they complete.
+    Returns the Monte Carlo quantiles per symbol.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+    windows = {symbol: month_windows(rates, train_months, test_months) for symbol, rates in series.items()}
+
+    with backtest_pool(series, workers, **backtester_kwargs) as pool:
+        # 1. In-sample sweep; only the best row per window is kept in memory
+        tasks = [(symbol, w, combination, train_start, test_start)
+                 for symbol, symbol_windows in windows.items()
+                 for w, (train_start, test_start, _) in enumerate(symbol_windows)
+                 for combination in combinations]
+        best: Dict[Tuple[str, int], Dict[str, float]] = {}
+        stream = CsvStream(os.path.join(out_dir, "train.csv"))
+        try:
+            futures = [pool.submit(_train, batch) for batch in _batches(tasks, TASK_BATCH)]
+            for done, future in enumerate(as_completed(futures), 1):
+                rows = future.result()
+                stream.write(rows)
+                for row in rows:
+                    key = (row["symbol"], row["window"])
+                    if key not in best or row[rank_by] > best[key][rank_by]:
+                        best[key] = row
+                print(f"\rTraining {done}/{len(futures)} batches", end="", flush=True)
+            print()
+        finally:
+            stream.close()
+
+        # 2. Out-of-sample replay of each window's winner
+        returns: Dict[str, List[Tuple[int, np.ndarray]]] = {symbol: [] for symbol in series}
+        stream = CsvStream(os.path.join(out_dir, "walk_forward.csv"))
+        try:
+            futures = []
+            for (symbol, w), row in best.items():
+                _, test_start, test_end = windows[symbol][w]
+                combination = {name: row[name] for name in combinations[0]}
+                futures.append(pool.submit(_test, (symbol, w, combination, test_start, test_end)))
+            for future in as_completed(futures):
+                row, trade_rets = future.result()
+                symbol, w = row["symbol"], row["window"]
+                train_start, test_start, test_end = windows[symbol][w]
+                rates = series[symbol]
+                stream.write([{"train_from": _date(rates, train_start), "test_from": _date(rates, test_start),
+                               "test_to": _date(rates, test_end - 1),
+                               f"train_{rank_by}": best[(symbol, w)][rank_by], **row}])
+                returns[symbol].append((w, trade_rets))
+        finally:
+            stream.close()
+
+        # 3. Monte Carlo over the out-of-sample trades, in window order
+        seeds = np.random.SeedSequence(seed)
+        stream = CsvStream(os.path.join(out_dir, "monte_carlo.csv"))
+        results: Dict[str, List[np.ndarray]] = {symbol: [] for symbol in series}
+        try:
+            futures = []
+            for symbol, by_window in returns.items():
+                trade_rets = np.concatenate([r for _, r in sorted(by_window, key=lambda x: x[0])] or [np.zeros(0)])
+                for first, chunk_seed in zip(range(0, simulations, MC_CHUNK), seeds.spawn(-(-simulations // MC_CHUNK))):
+                    paths = min(MC_CHUNK, simulations - first)
+                    futures.append(pool.submit(_simulate, (symbol, first, trade_rets, paths, chunk_seed, bootstrap)))
+            for future in as_completed(futures):
+                symbol, first, return_pct, drawdown_pct = future.result()
+                stream.write({"symbol": symbol, "simulation": first + i, "return_pct": r, "max_drawdown_pct": d}
+                             for i, (r, d) in enumerate(zip(return_pct.tolist(), drawdown_pct.tolist())))
+                results[symbol].append(np.stack([return_pct, drawdown_pct]))
+        finally:
+            stream.close()
+
+    quantiles = {}
+    for symbol, chunks in results.items():
+        if not chunks:
+            continue
+        return_pct, drawdown_pct = np.concatenate(chunks, axis=1)
+        quantiles[symbol] = {
+            **{f"return_p{q}": float(np.percentile(return_pct, q)) for q in QUANTILES},
+            **{f"drawdown_p{q}": float(np.percentile(drawdown_pct, q)) for q in QUANTILES},
+            "ruin_pct": float(np.mean(drawdown_pct >= 50) * 100),
+        }
+    return quantiles
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Walk-forward optimization and Monte Carlo drawdown analysis")
+    parser.add_argument("symbols", nargs="+")
+    parser.add_argument("--timeframe", type=parse_timeframe, default="M15")
+    parser.add_argument("--cache-dir", default="bar_cache")
+    parser.add_argument("--store", help="Read bars from this HistoryStore directory instead of the cache")
+    parser.add_argument("--start", help="First day to analyze (YYYY-MM-DD, store only)")
+    parser.add_argument("--end", help="Day to stop before (YYYY-MM-DD, store only)")
+    parser.add_argument("--train-months", type=int, default=TRAIN_MONTHS)
+    parser.add_argument("--test-months", type=int, default=TEST_MONTHS)
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=V1,V2",
+                        help="Values to sweep for one parameter; repeat for several (default: a built-in space)")
+    parser.add_argument("--random", type=int, default=100, metavar="N",
+                        help="Random combinations tried per window (0 for the full grid)")
+    parser.add_argument("--rank-by", choices=RANK_METRICS, default="calmar")
+    parser.add_argument("--simulations", type=int, default=MC_SIMULATIONS)
+    parser.add_argument("--shuffle", action="store_true",
+                        help="Resample by reordering the trades instead of drawing with replacement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--point", type=float, default=0.00001)
+    parser.add_argument("--tick-value", type=float, default=1.0)
+    parser.add_argument("--fixed-news-threshold", action="store_true",
+                        help="Skip bars on the old fixed open-close threshold (impact_threshold_pips) "
+                             "instead of the volatility regime")
+    parser.add_argument("--out", default="robustness", help="Directory for train.csv, walk_forward.csv and monte_carlo.csv")
+    args = parser.parse_args(argv)
+
+    series = {}
+    for symbol in args.symbols:
+        if args.store:
+            series[symbol] = np.array(load_store_range(args.store, symbol, args.timeframe, args.start, args.end))
+        else:
+            series[symbol] = load_rates(os.path.join(args.cache_dir, f"{symbol}_{args.timeframe}.npy"))
+    space = parse_space(args.param, args.fixed_news_threshold) if args.param else DEFAULT_SPACE
+    combinations = random_combinations(space, args.random, args.seed) if args.random else grid(space)
+
+    started = time.perf_counter()
+    quantiles = analyze(series, combinations, args.out, args.train_months, args.test_months, args.rank_by,
+                        args.simulations, not args.shuffle, args.seed, args.workers,
+                        point=args.point, tick_value=args.tick_value,
+                        use_volatility_regime=not args.fixed_news_threshold)
+    print(f"Finished in {time.perf_counter() - started:.1f}s, results in {args.out}/")
+    for symbol, q in quantiles.items():
+        print(f"{symbol}: return p5/p50/p95 {q['return_p5']:.1f}/{q['return_p50']:.1f}/{q['return_p95']:.1f}%, "
+              f"max drawdown p50/p95/p99 {q['drawdown_p50']:.1f}/{q['drawdown_p95']:.1f}/{q['drawdown_p99']:.1f}%, "
+              f"P(drawdown >= 50%) {q['ruin_pct']:.1f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+from bar_cache import BarCache
+from broker import SerializedBroker
+from metrics import METRICS
+from zones import ZoneTracker, seed_tracker, SUPPLY, DEMAND
+from indicators import IndicatorRegistry
+from confluence import TimeframeConfluence
+from orders import OrderManager
+from risk import RiskEngine
+from execute_trades import get_market_condition, evaluate_and_trade, new_zone_index, new_confluence, zone_entry
+
+class Scanner:
+    """
+    Scans a symbol/timeframe universe every cycle.
+    Full zone detection (first cycle or after a data gap) is the only heavy CPU work and runs on a
+    process pool, submitted as soon as a pair's bars are in so it overlaps with the remaining
+    refreshes and the incremental work. Everything else runs on the calling thread: terminal calls
+    go through one connection one at a time anyway, and incremental zone, confluence and indicator
+    updates only touch the newly closed bars, so threads would only add GIL contention.
+    Orders are queued to an OrderManager whose single executor thread sends them, so the scan never
+    waits on order_send, and one RiskEngine sizes and limits them across the whole universe.
+    """
+    def __init__(self, mt5, universe: List[Tuple[str, int]], history_bars: int, lookback_seconds: int,
+                 cache_dir: Optional[str] = None, zone_workers: Optional[int] = None, store=None):
+        self.mt5 = SerializedBroker(mt5)
+        self.universe = universe
+        self.lookback_seconds = lookback_seconds
+        self.cache = BarCache(self.mt5, history_bars=history_bars, cache_dir=cache_dir, store=store)
+        self.trackers: Dict[Tuple[str, int], ZoneTracker] = {}
+        self.confluence: Dict[Tuple[str, int], TimeframeConfluence] = {}
+        self.indicators = IndicatorRegistry()
+        self._zone_pool = ProcessPoolExecutor(max_workers=zone_workers or os.cpu_count())
+        self.risk = RiskEngine(self.mt5)
+        self.orders = OrderManager(self.mt5, risk=self.risk)
+        self._in_zone: Dict[Tuple[str, int], Tuple[bool, bool]] = {}
+
+    def scan(self, timeframes: Optional[Iterable[int]] = None, expected: Optional[Dict[int, int]] = None) -> int:
+        """
+        One cycle over the universe, or only the pairs on `timeframes` when given.
+        `expected` maps a timeframe to the server time its forming bar should have opened at
+        (BarScheduler passes it); a pair whose newest bar is older still counts the bar that
+        should have closed as forming, and is evaluated but not counted as current.
+        Returns the number of (symbol, timeframe) pairs that had current data this cycle.
+        """
+        started = time.perf_counter_ns()
+        universe = [key for key in self.universe if timeframes is None or key[1] in timeframes]
+
+        ready = []
+        current = 0
+        seeds = {}
+        for key in universe:
+            with METRICS.timer("scan.refresh"):
+                new_bars = self.cache.refresh(*key)
+            if new_bars is None:
+                print(f"Failed to get rates for {key[0]}, error code: {self.mt5.last_error()}")
+                continue
+            ready.append(key)
+
+            # Full zone detection is CPU-bound and goes to the process pool; incremental updates are cheap
+            rates = self.cache.bars(*key)
+            if expected is None or int(rates['time'][-1]) >= expected.get(key[1], 0):
+                current += 1
+            else:
+                print(f"{key[0]}: no bar since {expected[key[1]]} yet")
+            tracker = self.trackers.get(key)
+            if tracker is None or not tracker.covers(rates):
+                seeds[key] = self._zone_pool.submit(seed_tracker, rates, self.lookback_seconds,
+                                                    new_zone_index(self.mt5, key[0]))
+            else:
+                with METRICS.timer("scan.zones"):
+                    closed = tracker.update(rates)
+                if closed:
+                    print(f"{key[0]}: new bar closed - {len(tracker.supply_zones)} supply / {len(tracker.demand_zones)} demand zones")
+            # Higher timeframes are resampled from the same bars, and only when one of their bars closes
+            if key not in self.confluence:
+                self.confluence[key] = new_confluence(self.mt5, key[0], key[1], self.lookback_seconds)
+            if self.confluence[key] is not None:
+                with METRICS.timer("scan.confluence"):
+                    self.confluence[key].update(rates)
+
+        # Market conditions are evaluated on each pair's own timeframe while seeds are computed
+        with METRICS.timer("scan.market"):
+            conditions = {key: self._market_condition(key) for key in ready}
+
+        with METRICS.timer("scan.zone_seed_wait"):
+            for key, future in seeds.items():
+                self.trackers[key] = future.result()
+
+        # Decisions run here against the order book; the orders themselves are only queued
+        with METRICS.timer("scan.orders"):
+            for key in ready:
+                self._trade(key, self.trackers[key], conditions[key])
+        METRICS.record("scan.cycle", time.perf_counter_ns() - started)
+        return current
+
+    def watch_ticks(self) -> bool:
+        """
+        Cheap between-bar check: one symbol_info_tick per symbol, looked up in each pair's ZoneIndex
+        and higher-timeframe indexes (two bisects per index and side). A pair is re-evaluated only
+        when price moves into its entry region (touching a still-valid zone band), not on every poll
+        while it stays there.
+        Returns False if no tick could be read.
+        """
+        started = time.perf_counter_ns()
+        ticks = {}
+        for symbol in sorted({symbol for symbol, _ in self.trackers}):
+            ticks[symbol] = self.mt5.symbol_info_tick(symbol)
+
+        triggered = []
+        for key, tracker in self.trackers.items():
+            tick = ticks[key[0]]
+            if tick is None:
+                continue
+            if tracker.index is not None:
+                confluence = self.confluence.get(key)
+                in_zone = (zone_entry(SUPPLY, tick.bid, tracker.index, confluence),
+                           zone_entry(DEMAND, tick.ask, tracker.index, confluence))
+            else:
+                supply, demand = tracker.supply_zones, tracker.demand_zones
+                in_zone = (bool(supply) and tick.bid > supply[-1][1], bool(demand) and tick.ask < demand[-1][1])
+            previous = self._in_zone.get(key, (False, False))
+            self._in_zone[key] = in_zone
+            if any(now and not before for now, before in zip(in_zone, previous)):
+                triggered.append(key)
+
+        for key in triggered:
+            # Bring the forming bar up to date so the market condition reflects the touch
+            self.cache.refresh(*key)
+            market = self._market_condition(key)
+            self._trade(key, self.trackers[key], market)
+        METRICS.record("scan.watch_ticks", time.perf_counter_ns() - started)
+        return any(tick is not None for tick in ticks.values()) or not ticks
+
+    def state(self) -> Dict:
+        """Zone trackers, higher-timeframe indexes and indicators, for state.save_state"""
+        return {"trackers": self.trackers, "confluence": self.confluence, "indicators": self.indicators}
+
+    def restore(self, state: Dict) -> int:
+        """
+        Warm start from a state() snapshot: the next scan only feeds the bars that closed since it
+        was saved instead of re-seeding every pair. Pairs outside the universe are dropped.
+        Returns the number of pairs restored.
+        """
+        universe = set(self.universe)
+        self.trackers = {key: tracker for key, tracker in state.get("trackers", {}).items() if key in universe}
+        self.confluence = {key: value for key, value in state.get("confluence", {}).items() if key in universe}
+        if "indicators" in state:
+            self.indicators = state["indicators"]
+        return len(self.trackers)
+
+    def _market_condition(self, key: Tuple[str, int]) -> Tuple[str, float]:
+        with METRICS.timer("stage.market_condition"):
+            return get_market_condition(self.mt5, key[0], cache=self.cache, indicators=self.indicators, timeframe=key[1])
+
+    def _trade(self, key: Tuple[str, int], tracker: ZoneTracker, market: Tuple[str, float]) -> None:
+        with METRICS.timer("stage.evaluate_and_trade"):
+            evaluate_and_trade(self.mt5, key[0], tracker.supply_zones, tracker.demand_zones, cache=self.cache, market=market,
+                               indicators=self.indicators, zone_index=tracker.index, confluence=self.confluence.get(key),
+                               orders=self.orders, risk=self.risk, timeframe=key[1])
+
+    def close(self) -> None:
+        self.orders.close()
+        self._zone_pool.shutdown()
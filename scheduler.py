@@ -0,0 +1,111 @@
+import heapq
+import random
+import time
+from typing import Callable, Iterable, Optional
+from bar_cache import timeframe_seconds
+
+BAR_CLOSE_GRACE = 1.0  # Seconds after the boundary before the closed bar is requested
+MAX_SERVER_OFFSET = 14 * 3600
+
+def next_bar_close(now: float, timeframe: int, server_offset: float = 0.0) -> float:
+    """
+    Local time at which the current bar of `timeframe` closes.
+    Bars are aligned to the broker's server clock, which runs `server_offset` seconds ahead of local time.
+    """
+    period = timeframe_seconds(timeframe)
+    server_now = now + server_offset
+    return (server_now // period + 1) * period - server_offset
+
+def bar_open(now: float, timeframe: int, server_offset: float = 0.0) -> int:
+    """Server time the bar of `timeframe` forming at local time `now` opened at"""
+    period = timeframe_seconds(timeframe)
+    return int((now + server_offset) // period * period)
+
+def estimate_server_offset(mt5, symbol: str, now: Optional[float] = None) -> float:
+    """
+    Server clock offset from the last tick time, rounded to the half hour timezones are cut in.
+    Falls back to 0 when there is no tick or it is implausibly old (e.g. over a weekend).
+    """
+    tick = mt5.symbol_info_tick(symbol)
+    if tick is None:
+        return 0.0
+    offset = round((tick.time - (now or time.time())) / 1800) * 1800
+    return float(offset) if abs(offset) <= MAX_SERVER_OFFSET else 0.0
+
+class Backoff:
+    """
+    Exponential backoff with full jitter: the n-th consecutive failure waits uniformly in [0, base * 2^n], capped.
+    """
+    def __init__(self, base: float = 1.0, cap: float = 300.0, rng: Optional[random.Random] = None):
+        self.base = base
+        self.cap = cap
+        self.failures = 0
+        self._random = rng or random.Random()
+
+    def next_delay(self) -> float:
+        delay = self._random.uniform(0, min(self.cap, self.base * 2 ** self.failures))
+        self.failures += 1
+        return delay
+
+    def reset(self) -> None:
+        self.failures = 0
+
+class BarScheduler:
+    """
+    Event loop that wakes exactly when a bar closes on each timeframe, and polls
+    ticks every `tick_interval` seconds in between.
+    on_bar_close(timeframes, expected) gets, per timeframe, the server time the bar forming now
+    opened at, and returns a truthy value once every pair has that bar. on_tick() returns a truthy
+    value on success. Failures are retried with jittered backoff (bar closes at the latest on the
+    next boundary) instead of waiting for the next regular wake-up.
+    Wake-ups are re-armed from the boundary just handled, so a scan that runs past the next
+    boundary is followed by that bar's scan at once rather than skipping it.
+    """
+    def __init__(self, timeframes: Iterable[int], on_bar_close: Callable, on_tick: Optional[Callable] = None,
+                 tick_interval: float = 2.0, server_offset: float = 0.0,
+                 clock: Callable[[], float] = time.time, sleep: Callable[[float], None] = time.sleep):
+        self.timeframes = sorted(set(timeframes))
+        self.on_bar_close = on_bar_close
+        self.on_tick = on_tick
+        self.tick_interval = tick_interval
+        self.server_offset = server_offset
+        self.clock = clock
+        self.sleep = sleep
+        self._bar_backoff = Backoff()
+        self._tick_backoff = Backoff(base=tick_interval, cap=60.0)
+
+    def run(self, until: Optional[Callable[[], bool]] = None) -> None:
+        now = self.clock()
+        # Everything runs once at start-up so the bot does not wait a whole bar for its first look
+        events = [(now, 0, "bar", tuple(self.timeframes))]
+        if self.on_tick:
+            events.append((now + self.tick_interval, 1, "tick", ()))
+        heapq.heapify(events)
+
+        while not (until and until()):
+            when, priority, kind, timeframes = heapq.heappop(events)
+            delay = when - self.clock()
+            if delay > 0:
+                self.sleep(delay)
+
+            if kind == "bar":
+                # Several timeframes can close on the same boundary (e.g. M15 and H1 on the hour)
+                while events and events[0][2] == "bar" and events[0][0] <= when:
+                    timeframes += heapq.heappop(events)[3]
+                expected = {timeframe: bar_open(when, timeframe, self.server_offset) for timeframe in timeframes}
+                done = self.on_bar_close(timeframes, expected)
+                if done:
+                    self._bar_backoff.reset()
+                now = self.clock()
+                retry = now + self._bar_backoff.next_delay() if not done else None
+                for timeframe in timeframes:
+                    # Several missed boundaries are caught up by one scan at the latest of them
+                    since = max(when, now - timeframe_seconds(timeframe))
+                    close = next_bar_close(since, timeframe, self.server_offset) + BAR_CLOSE_GRACE
+                    heapq.heappush(events, (close if done else min(retry, close), 0, "bar", (timeframe,)))
+            else:
+                if self.on_tick():
+                    self._tick_backoff.reset()
+                    heapq.heappush(events, (self.clock() + self.tick_interval, 1, "tick", ()))
+                else:
+                    heapq.heappush(events, (self.clock() + self._tick_backoff.next_delay(), 1, "tick", ()))
@@ -0,0 +1,35 @@
+import os
+import pickle
+import time
+from typing import Dict, Optional
+
+STATE_VERSION = 3  # Bump when a pickled class changes shape, so old snapshots are ignored
+
+def save_state(path: str, state: Dict) -> None:
+    """Pickle a Scanner.state() snapshot, replacing the file atomically"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"version": STATE_VERSION, "saved_at": time.time(), "state": state}, f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+def load_state(path: str, max_age: Optional[float] = None) -> Optional[Dict]:
+    """
+    The snapshot saved at `path`, or None if there is none, it is from another STATE_VERSION,
+    older than `max_age` seconds or unreadable. A missing or rejected snapshot means a cold start.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            saved = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+        print(f"Ignoring unreadable state snapshot {path}: {e}")
+        return None
+    if not isinstance(saved, dict) or saved.get("version") != STATE_VERSION:
+        print(f"Ignoring state snapshot {path} from another version")
+        return None
+    if max_age is not None and time.time() - saved["saved_at"] > max_age:
+        print(f"Ignoring state snapshot {path}: {time.time() - saved['saved_at']:.0f}s old")
+        return None
+    return saved["state"]
@@ -0,0 +1,34 @@
+import numpy as np
+from benchmark import synthetic_rates
+from history_store import HistoryStore, HEADER_SIZE, RATES_DTYPE
+
+def test_append_and_range(tmp_path):
+    rates = synthetic_rates(1000)
+    store = HistoryStore(str(tmp_path))
+    assert store.append("EURUSD", 15, rates[:600]) == 600
+    # Bars already stored are skipped
+    assert store.append("EURUSD", 15, rates[500:]) == 400
+    assert np.array_equal(store.read("EURUSD", 15)['time'], rates['time'])
+    times = rates['time']
+    assert np.array_equal(store.range("EURUSD", 15, int(times[100]), int(times[200]))['time'], times[100:200])
+
+def test_torn_write_is_cut_off(tmp_path):
+    rates = synthetic_rates(1000)
+    store = HistoryStore(str(tmp_path))
+    store.append("EURUSD", 15, rates[:500])
+    # A crash part-way through the next block leaves a partial record behind
+    with open(store.path("EURUSD", 15), "ab") as f:
+        f.write(rates[500:501].astype(RATES_DTYPE).tobytes()[:20])
+    assert store.last_time("EURUSD", 15) == int(rates['time'][499])
+    assert store.append("EURUSD", 15, rates[500:]) == 500
+    assert np.array_equal(store.read("EURUSD", 15)['time'], rates['time'])
+
+def test_torn_header(tmp_path):
+    rates = synthetic_rates(10)
+    store = HistoryStore(str(tmp_path))
+    with open(store.path("EURUSD", 15), "wb") as f:
+        f.write(b"SDB")
+    assert len(store.read("EURUSD", 15)) == 0
+    store.append("EURUSD", 15, rates)
+    assert np.array_equal(store.read("EURUSD", 15)['time'], rates['time'])
+    assert (len(open(store.path("EURUSD", 15), "rb").read()) - HEADER_SIZE) % RATES_DTYPE.itemsize == 0
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmark import synthetic_rates
+from indicators import IndicatorState, ema_series, volatility_series
+
+def snapshot(state, forming):
+    """Everything IndicatorState carries, plus what the live path reads for the forming bar"""
+    return (state.ema_fast.value, state.ema_slow.value, state.rsi.avg_gain, state.rsi.avg_loss, state.rsi.count,
+            state.atr.value, state.market_inputs(float(forming['close'])),
+            state.volatility.classify(float(forming['high']), float(forming['low'])), state.last_time)
+
+def seeded(rates):
+    state = IndicatorState()
+    state.update(rates)
+    return state
+
+@pytest.mark.parametrize("span", [1, 20, 50, 200])
+def test_ema_matches_pandas(span):
+    closes = synthetic_rates(5000, seed=span)['close']
+    expected = pd.Series(closes).ewm(span=span, adjust=False).mean().to_numpy()
+    np.testing.assert_allclose(ema_series(closes, span), expected, rtol=1e-12)
+
+def test_bar_by_bar_matches_seed():
+    rates = synthetic_rates(3000, seed=1)
+    state = IndicatorState()
+    for end in range(1, len(rates) + 1):
+        state.update(rates[:end])
+        if end % 250 == 0:
+            assert snapshot(state, rates[end - 1]) == snapshot(seeded(rates[:end]), rates[end - 1])
+
+def test_rolling_window_keeps_full_history():
+    # The cache drops its oldest bars as new ones close; the state must still equal one seeded
+    # over everything seen, not just the current window
+    rates = synthetic_rates(3000, seed=2)
+    state = seeded(rates[:800])
+    for end in range(801, len(rates) + 1, 3):
+        state.update(rates[end - 800:end])
+    assert snapshot(state, rates[end - 1]) == snapshot(seeded(rates[:end]), rates[end - 1])
+
+def test_gap_reseeds():
+    rates = synthetic_rates(3000, seed=3)
+    state = seeded(rates[:1000])
+    # A window starting after the last bar seen cannot continue the series
+    window = rates[1500:2500]
+    assert state.update(window) == len(window) - 1
+    assert snapshot(state, window[-1]) == snapshot(seeded(window), window[-1])
+
+def test_volatility_series_matches_state():
+    rates = synthetic_rates(2000, seed=4)
+    regimes = volatility_series(rates['high'], rates['low'], rates['close'])
+    state = IndicatorState()
+    for end in range(1, len(rates) + 1, 37):
+        state.update(rates[:end])
+        assert state.volatility.classify(float(rates['high'][end - 1]), float(rates['low'][end - 1])) == regimes[end - 1]
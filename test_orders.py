@@ -0,0 +1,109 @@
+import pytest
+from benchmark import synthetic_rates
+from broker import SimulatedBroker
+from orders import OrderManager, FILLED, client_id_of
+
+SYMBOL = "EURUSD"
+POINT = 0.00001
+
+class LostAnswerBroker(SimulatedBroker):
+    """
+    Answers None to the first `lost` sends, as when the terminal connection drops mid-call.
+    With `carried_out` those sends still open their position, otherwise they never arrived.
+    """
+    def __init__(self, *args, lost: int = 1, carried_out: bool = True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lost = lost
+        self.carried_out = carried_out
+        self.sends = 0
+
+    def order_send(self, request):
+        self.sends += 1
+        if self.lost:
+            self.lost -= 1
+            if self.carried_out:
+                super().order_send(request)
+            return None
+        return super().order_send(request)
+
+def buy_request(broker, offset_points=0):
+    price = round(broker.symbol_info_tick(SYMBOL).ask + offset_points * POINT, 5)
+    return {"action": broker.TRADE_ACTION_DEAL, "symbol": SYMBOL, "volume": 0.1, "type": broker.ORDER_TYPE_BUY,
+            "price": price, "sl": round(price - 200 * POINT, 5), "tp": round(price + 400 * POINT, 5),
+            "deviation": 10, "magic": 234000, "comment": "Buy order - test"}
+
+@pytest.fixture
+def rates():
+    return synthetic_rates(200)
+
+def manager_for(broker):
+    # No idle reconciles; the executor still syncs once its queue runs empty, and may settle a
+    # record before the test reads it, so records are taken at submit time
+    return OrderManager(broker, reconcile_interval=3600)
+
+def test_requote_is_resent_with_shifted_stops(rates):
+    # Seed 10 slips 36 points on the first send (over the 10 point deviation) and 2 on the second
+    broker = SimulatedBroker(SYMBOL, rates, slippage_points=50, seed=10, start_index=100)
+    orders = manager_for(broker)
+    request = buy_request(broker, offset_points=-50)
+    record = orders.record(orders.submit(request))
+    orders.wait()
+    assert (record.state, record.attempts, record.retcode) == (FILLED, 2, broker.TRADE_RETCODE_DONE)
+    (pos,) = broker.positions_get()
+    ask = broker.symbol_info_tick(SYMBOL).ask
+    assert pos.price_open == pytest.approx(ask + 2 * POINT)
+    assert pos.sl == pytest.approx(request["sl"] + 50 * POINT)
+    assert pos.tp == pytest.approx(request["tp"] + 50 * POINT)
+    orders.close()
+
+def test_requotes_give_up_after_max_attempts(rates):
+    # Seed 0 slips 24, 48 and 26 points, all over the deviation
+    broker = SimulatedBroker(SYMBOL, rates, slippage_points=50, seed=0, start_index=100)
+    orders = manager_for(broker)
+    client_id = orders.submit(buy_request(broker))
+    orders.wait()
+    # A failed order leaves the book at once
+    assert orders.record(client_id) is None
+    assert broker.positions_get() == () and orders.positions() == []
+    orders.close()
+
+def test_lost_answer_finds_position_by_client_id(rates):
+    broker = LostAnswerBroker(SYMBOL, rates, start_index=100)
+    orders = manager_for(broker)
+    client_id = orders.submit(buy_request(broker))
+    record = orders.record(client_id)
+    orders.wait()
+    # The order went through, so it is not sent a second time
+    (pos,) = broker.positions_get()
+    assert broker.sends == 1
+    assert (record.state, record.ticket) == (FILLED, pos.ticket)
+    assert client_id_of(pos.comment) == client_id
+    orders.close()
+
+def test_lost_answer_without_position_is_resent(rates):
+    broker = LostAnswerBroker(SYMBOL, rates, carried_out=False, start_index=100)
+    orders = manager_for(broker)
+    record = orders.record(orders.submit(buy_request(broker)))
+    orders.wait()
+    (pos,) = broker.positions_get()
+    assert broker.sends == 2
+    assert (record.state, record.attempts, record.ticket) == (FILLED, 2, pos.ticket)
+    orders.close()
+
+def test_reconcile_settles_filled_orders(rates):
+    broker = SimulatedBroker(SYMBOL, rates, start_index=100)
+    orders = manager_for(broker)
+    # Position list unreachable, so the executor's own reconcile cannot settle anything
+    positions_get, broker.positions_get = broker.positions_get, lambda **kwargs: None
+    client_ids = [orders.submit(buy_request(broker)) for _ in range(3)]
+    orders.wait()
+    assert not orders.reconcile()
+    assert all(orders.record(client_id).state == FILLED for client_id in client_ids)
+    tickets = sorted(pos.ticket for pos in orders.positions())
+    assert tickets == [1, 2, 3]
+    broker.positions_get = positions_get
+    assert orders.reconcile()
+    # Listed by the terminal now, so they leave the in-flight list without being counted twice
+    assert all(orders.record(client_id) is None for client_id in client_ids)
+    assert sorted(pos.ticket for pos in orders.positions()) == tickets
+    orders.close()
@@ -0,0 +1,119 @@
+import pytest
+from benchmark import synthetic_rates
+from broker import SimulatedBroker
+from risk import RiskEngine
+from scanner import Scanner
+
+SYMBOL = "EURUSD"
+
+class FlakyBroker(SimulatedBroker):
+    """account_info() answers None for the first `failures` calls"""
+    def __init__(self, *args, failures: int = 1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failures = failures
+        self.account_calls = 0
+
+    def account_info(self):
+        self.account_calls += 1
+        if self.failures:
+            self.failures -= 1
+            return None
+        return super().account_info()
+
+@pytest.fixture
+def broker():
+    return SimulatedBroker(SYMBOL, synthetic_rates(500), start_index=100)
+
+def open_position(broker, order_type, volume, sl=0.0):
+    tick = broker.symbol_info_tick(SYMBOL)
+    price = tick.ask if order_type == broker.ORDER_TYPE_BUY else tick.bid
+    result = broker.order_send({"action": broker.TRADE_ACTION_DEAL, "symbol": SYMBOL, "volume": volume,
+                                "type": order_type, "price": price, "sl": sl, "deviation": 10})
+    assert result.retcode == broker.TRADE_RETCODE_DONE
+    return result.order
+
+def test_totals_follow_add_and_remove(broker):
+    risk = RiskEngine(broker)
+    risk.add("sd1-1", SYMBOL, broker.ORDER_TYPE_BUY, 1.0, 1.1, sl=1.099)
+    # 100000 EUR bought at 1.1 with 100x leverage, 100 points of stop at $1 per point per lot
+    assert risk.margin == pytest.approx(1100)
+    assert risk.risk == pytest.approx(100)
+    assert risk.exposure == pytest.approx({"EUR": 110000, "USD": -110000})
+    # Without a stop the whole notional is at risk
+    risk.add("sd1-2", SYMBOL, broker.ORDER_TYPE_SELL, 0.5, 1.1)
+    assert risk.margin == pytest.approx(1650)
+    assert risk.risk == pytest.approx(55100)
+    assert risk.exposure == pytest.approx({"EUR": 55000, "USD": -55000})
+    # Adding under a key already counted replaces it
+    risk.add("sd1-2", SYMBOL, broker.ORDER_TYPE_SELL, 1.0, 1.1)
+    assert risk.exposure == pytest.approx({"EUR": 0, "USD": 0})
+    risk.remove("sd1-1")
+    risk.remove("sd1-2")
+    risk.remove("sd1-3")
+    assert (risk.margin, risk.risk) == pytest.approx((0, 0))
+    assert risk.exposure == pytest.approx({"EUR": 0, "USD": 0})
+
+def test_update_positions_tracks_terminal(broker):
+    tickets = [open_position(broker, broker.ORDER_TYPE_BUY, 0.5), open_position(broker, broker.ORDER_TYPE_SELL, 0.2)]
+    risk = RiskEngine(broker)
+    assert risk.margin == pytest.approx(broker.account_info().margin)
+    for _ in range(5):
+        broker.advance()
+    tickets.append(open_position(broker, broker.ORDER_TYPE_BUY, 0.1))
+    risk.update_positions(broker.positions_get())
+    account = broker.account_info()
+    assert risk.margin == pytest.approx(account.margin)
+    assert risk.account_info().equity == pytest.approx(account.equity)
+    # A closed ticket is dropped and the balance re-read
+    tick = broker.symbol_info_tick(SYMBOL)
+    broker.order_send({"action": broker.TRADE_ACTION_DEAL, "symbol": SYMBOL, "volume": 0.5, "position": tickets[0],
+                       "type": broker.ORDER_TYPE_SELL, "price": tick.bid, "deviation": 10})
+    risk.update_positions(broker.positions_get())
+    account = broker.account_info()
+    assert risk.margin == pytest.approx(account.margin)
+    assert risk.account_info().balance == account.balance
+    eur = sum((1 if pos.type == broker.POSITION_TYPE_BUY else -1) * pos.volume * 100000 * pos.price_open
+              for pos in broker.positions_get())
+    assert risk.exposure["EUR"] == pytest.approx(eur)
+
+def test_check_reasons(broker):
+    risk = RiskEngine(broker, max_total_risk_percent=10, max_currency_exposure=30)
+    price = broker.symbol_info_tick(SYMBOL).ask
+    assert risk.check(SYMBOL, broker.ORDER_TYPE_BUY, 0.1, price, price - 0.002) is None
+    assert risk.check(SYMBOL, broker.ORDER_TYPE_BUY, 100, price, price - 0.002).startswith("margin ")
+    # $10000 equity, so more than $1000 of stop-loss risk is refused
+    assert risk.check(SYMBOL, broker.ORDER_TYPE_BUY, 0.6, price, price - 0.02).startswith("total risk ")
+    assert risk.check("GBPUSD", broker.ORDER_TYPE_BUY, 0.1, price) == "no contract or account data"
+    # 3x equity per currency
+    risk = RiskEngine(broker, max_currency_exposure=3)
+    risk.add("sd1-1", SYMBOL, broker.ORDER_TYPE_BUY, 0.2, price, price - 0.001)
+    assert risk.check(SYMBOL, broker.ORDER_TYPE_BUY, 0.1, price, price - 0.001).startswith("EUR exposure ")
+    # Orders that bring the exposure back down are allowed however large it is
+    assert risk.check(SYMBOL, broker.ORDER_TYPE_SELL, 0.1, price, price + 0.001) is None
+
+def test_failed_sync_is_retried():
+    broker = FlakyBroker(SYMBOL, synthetic_rates(500), failures=2, start_index=100)
+    risk = RiskEngine(broker)
+    price = broker.symbol_info_tick(SYMBOL).ask
+    assert risk.account_info() is None
+    assert risk.check(SYMBOL, broker.ORDER_TYPE_BUY, 0.1, price, price - 0.002) is None
+    assert broker.account_calls == 3
+    # Synced now, so later checks do not go back to the terminal
+    risk.check(SYMBOL, broker.ORDER_TYPE_BUY, 0.1, price, price - 0.002)
+    assert broker.account_calls == 3
+
+def test_scanner_margin_matches_broker():
+    broker = SimulatedBroker(SYMBOL, synthetic_rates(6000, seed=3), start_index=3000)
+    scanner = Scanner(broker, [(SYMBOL, broker.TIMEFRAME_M15)], history_bars=2880, lookback_seconds=30 * 86400)
+    checked = 0
+    for i in range(600):
+        scanner.scan()
+        scanner.watch_ticks()
+        broker.advance()
+        if i % 50 == 49:
+            scanner.orders.wait()
+            scanner.orders.reconcile()
+            assert scanner.risk.margin == pytest.approx(broker.account_info().margin)
+            checked += bool(broker.positions_get())
+    scanner.close()
+    assert checked
@@ -0,0 +1,28 @@
+import subprocess
+import sys
+import numpy as np
+from broker import Tick
+from ticks import TickRecorder, TICK_DTYPE, read_chunks, tick_count
+
+def make_tick(i):
+    return Tick(time=i, bid=1.1 + i * 1e-5, ask=1.1002 + i * 1e-5, last=0.0, volume=0, time_msc=i * 1000, flags=6, volume_real=0.0)
+
+def test_torn_block_is_cut_off(tmp_path):
+    with TickRecorder(str(tmp_path), buffer_size=10) as recorder:
+        for i in range(25):
+            recorder.record("EURUSD", make_tick(i))
+    path = recorder.path("EURUSD")
+    # A crash part-way through the next block leaves a partial tick behind
+    with open(path, "ab") as f:
+        f.write(b"\x01" * (TICK_DTYPE.itemsize // 2))
+    with TickRecorder(str(tmp_path), buffer_size=10) as recorder:
+        for i in range(25, 40):
+            recorder.record("EURUSD", make_tick(i))
+    assert tick_count(path) == 40
+    times = np.concatenate(list(read_chunks(path)))['time_msc']
+    assert np.array_equal(times, np.arange(40) * 1000)
+
+def test_recording_does_not_load_backtest():
+    # The live process imports broker and ticks; the backtester and its strategy imports stay out of it
+    code = "import sys, broker, ticks; sys.exit('backtest' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
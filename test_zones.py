@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmark import synthetic_rates
+from zones import (find_zones, find_zones_in_rates, isSupport, isResistance, ZoneIndex, ZoneTracker,
+                   SUPPLY, DEMAND)
+
+def loop_find_zones(df):
+    """The original per-bar find_zones, kept as the reference implementation"""
+    supply_zones = []
+    demand_zones = []
+    for i in range(2, len(df) - 2):
+        if isSupport(df, i):
+            demand_zones.append((df.index[i], df['low'].iloc[i]))
+        if isResistance(df, i):
+            supply_zones.append((df.index[i], df['high'].iloc[i]))
+    return supply_zones, demand_zones
+
+def make_bars(n, seed=0, tick=None):
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 0.0005, n))
+    high = close + rng.uniform(0, 0.001, n)
+    low = close - rng.uniform(0, 0.001, n)
+    if tick is not None:
+        # Coarse prices produce equal neighbours, which must not count as pivots
+        high, low = np.round(high / tick) * tick, np.round(low / tick) * tick
+    index = pd.date_range("2024-01-01", periods=n, freq="15min")
+    return pd.DataFrame({"high": high, "low": low, "close": close}, index=index)
+
+@pytest.mark.parametrize("n", [0, 1, 2, 3, 4, 5, 6])
+def test_short_series(n):
+    df = make_bars(n)
+    assert find_zones(df) == loop_find_zones(df)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_series(seed):
+    df = make_bars(3000, seed)
+    supply, demand = find_zones(df)
+    assert (supply, demand) == loop_find_zones(df)
+    assert supply and demand
+
+def test_equal_prices():
+    df = make_bars(3000, seed=7, tick=0.0005)
+    assert find_zones(df) == loop_find_zones(df)
+
+def test_rates_array():
+    df = make_bars(3000, seed=3)
+    rates = np.zeros(len(df), dtype=[("time", "<i8"), ("high", "<f8"), ("low", "<f8")])
+    rates["time"] = df.index.as_unit("s").asi8
+    rates["high"], rates["low"] = df["high"].to_numpy(), df["low"].to_numpy()
+    assert find_zones_in_rates(rates) == find_zones(df)
+
+def band_state(index):
+    return [[(b.low, b.high, b.first_time, b.last_time, b.pivots) for b in index.bands(kind)] for kind in (SUPPLY, DEMAND)]
+
+def feed(step, lookback, rates, first=1200, window=1500):
+    """Tracker seeded on the first bars and then updated `step` bars at a time with rolling windows"""
+    tracker = ZoneTracker(lookback, ZoneIndex(30e-5, 20e-5))
+    tracker.seed(rates[:first])
+    for end in range(first + step, len(rates) + 1, step):
+        assert tracker.update(rates[max(0, end - window):end])
+        yield end, tracker
+
+@pytest.mark.parametrize("step", [1, 7, 50])
+def test_tracker_update_without_trim(step):
+    rates = synthetic_rates(2400, seed=step)
+    for end, tracker in feed(step, 60 * 24 * 3600, rates):
+        assert (tracker.supply_zones, tracker.demand_zones) == find_zones_in_rates(tracker.bars)
+        fresh = ZoneTracker(tracker.lookback_seconds, ZoneIndex(30e-5, 20e-5))
+        fresh.seed(rates[:end])
+        assert band_state(tracker.index) == band_state(fresh.index)
+
+@pytest.mark.parametrize("step", [7, 50])
+def test_tracker_update_with_trim(step):
+    # 960 M15 bars of lookback, so every update trims the buffer. The index then also holds bands
+    # whose pivots merged with since-expired ones, which a fresh seed cannot see, so it is checked
+    # against bar-by-bar updates instead
+    rates = synthetic_rates(4000, seed=step)
+    lookback = 10 * 24 * 3600
+    by_bar = {end: band_state(tracker.index) for end, tracker in feed(1, lookback, rates)}
+    for end, tracker in feed(step, lookback, rates):
+        assert len(tracker.bars) <= lookback // 900 + 1
+        assert (tracker.supply_zones, tracker.demand_zones) == find_zones_in_rates(tracker.bars)
+        assert band_state(tracker.index) == by_bar[end]
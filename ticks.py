@@ -0,0 +1,129 @@
+import argparse
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional
+import numpy as np
+from broker import Tick
+from history_store import append_records
+
+# One record per tick, 28 bytes
+TICK_DTYPE = np.dtype([('time_msc', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('flags', '<u4')])
+MAGIC = b"SDTICK\x00\x01"
+HEADER_SIZE = 16  # MAGIC + reserved
+REPLAY_CHUNK = 65536  # Records read per file read while replaying
+FLUSH_INTERVAL = 60.0  # Seconds buffered ticks may wait before being written, so a crash loses at most this much
+
+class TickRecorder:
+    """
+    Appends symbol_info_tick results to one binary file of TICK_DTYPE records per symbol.
+    Repeats of the previous tick (same time and prices, as returned by polling between updates)
+    are dropped, and records are buffered and written in blocks: when a symbol's buffer is full,
+    and for every symbol at least every `flush_interval` seconds.
+    """
+    def __init__(self, root: str, buffer_size: int = 1024, flush_interval: float = FLUSH_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.root = root
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self._buffers: Dict[str, List[tuple]] = {}
+        self._last: Dict[str, tuple] = {}
+        self._flushed = clock()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, symbol: str) -> str:
+        return os.path.join(self.root, f"{symbol}.ticks")
+
+    def record(self, symbol: str, tick) -> bool:
+        """Buffer one tick; returns False if it repeats the previous one"""
+        record = (int(tick.time_msc), float(tick.bid), float(tick.ask), int(tick.flags))
+        repeat = self._last.get(symbol) == record
+        if not repeat:
+            self._last[symbol] = record
+            buffer = self._buffers.setdefault(symbol, [])
+            buffer.append(record)
+            if len(buffer) >= self.buffer_size:
+                self._write(symbol)
+        # Checked on repeats too, so ticks buffered before a quiet spell still reach the disk
+        if self.clock() - self._flushed >= self.flush_interval:
+            self.flush()
+        return not repeat
+
+    def flush(self) -> None:
+        for symbol in self._buffers:
+            self._write(symbol)
+        self._flushed = self.clock()
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write(self, symbol: str) -> None:
+        buffer = self._buffers[symbol]
+        if not buffer:
+            return
+        # A block torn by a crash is cut back to whole ticks first, so later ticks stay aligned
+        append_records(self.path(symbol), MAGIC, np.array(buffer, dtype=TICK_DTYPE))
+        buffer.clear()
+
+def tick_count(path: str) -> int:
+    return max(0, os.path.getsize(path) - HEADER_SIZE) // TICK_DTYPE.itemsize
+
+def read_chunks(path: str, chunk_size: int = REPLAY_CHUNK) -> Iterator[np.ndarray]:
+    """TICK_DTYPE arrays of up to chunk_size records, oldest first; only one chunk is held at a time"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a tick file")
+        f.seek(HEADER_SIZE)
+        while True:
+            data = f.read(chunk_size * TICK_DTYPE.itemsize)
+            count = len(data) // TICK_DTYPE.itemsize
+            if count == 0:
+                return
+            yield np.frombuffer(data[:count * TICK_DTYPE.itemsize], dtype=TICK_DTYPE)
+
+def replay(path: str, start_msc: Optional[int] = None, end_msc: Optional[int] = None,
+           chunk_size: int = REPLAY_CHUNK) -> Iterator[Tick]:
+    """
+    Recorded ticks as MetaTrader5-style Tick tuples, streamed from disk.
+    start_msc/end_msc bound the replay to start_msc <= time_msc < end_msc.
+    """
+    for chunk in read_chunks(path, chunk_size):
+        if start_msc is not None:
+            chunk = chunk[chunk['time_msc'] >= start_msc]
+        if end_msc is not None:
+            if len(chunk) and chunk['time_msc'][0] >= end_msc:
+                return
+            chunk = chunk[chunk['time_msc'] < end_msc]
+        for time_msc, bid, ask, flags in zip(chunk['time_msc'].tolist(), chunk['bid'].tolist(),
+                                             chunk['ask'].tolist(), chunk['flags'].tolist()):
+            yield Tick(time_msc // 1000, bid, ask, 0.0, 0, time_msc, flags, 0.0)
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect a recorded tick file")
+    parser.add_argument("path")
+    args = parser.parse_args(argv)
+
+    count = tick_count(args.path)
+    if count == 0:
+        print(f"{args.path}: no ticks")
+        return
+    spreads = []
+    first = last = None
+    for chunk in read_chunks(args.path):
+        first = first if first is not None else int(chunk['time_msc'][0])
+        last = int(chunk['time_msc'][-1])
+        spreads.append(float((chunk['ask'] - chunk['bid']).mean()) * len(chunk))
+    start = datetime.fromtimestamp(first / 1000, timezone.utc)
+    end = datetime.fromtimestamp(last / 1000, timezone.utc)
+    print(f"{args.path}: {count} ticks from {start:%Y-%m-%d %H:%M:%S} to {end:%Y-%m-%d %H:%M:%S}, "
+          f"mean spread {sum(spreads) / count:.6f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,288 @@
-from typing import Tuple, List
-import pandas as pd
+import bisect
+from typing import TYPE_CHECKING, Dict, Tuple, List, Optional
+import numpy as np
 
-def isSupport(df: pd.DataFrame, i: int) -> bool:
-    support = (df['low'][i] < df['low'][i-1] and df['low'][i] < df['low'][i+1] and
-               df['low'][i+1] < df['low'][i+2] and df['low'][i-1] < df['low'][i-2])
+if TYPE_CHECKING:
+    # pandas is only needed by the DataFrame helpers; the live path never imports it
+    import pandas as pd
+
+def isSupport(df: "pd.DataFrame", i: int) -> bool:
+    low = df['low'].iloc
+    support = (low[i] < low[i-1] and low[i] < low[i+1] and
+               low[i+1] < low[i+2] and low[i-1] < low[i-2])
     return support
 
-def isResistance(df: pd.DataFrame, i: int) -> bool:
-    resistance = (df['high'][i] > df['high'][i-1] and df['high'][i] > df['high'][i+1] and
-                  df['high'][i+1] > df['high'][i+2] and df['high'][i-1] > df['high'][i-2])
+def isResistance(df: "pd.DataFrame", i: int) -> bool:
+    high = df['high'].iloc
+    resistance = (high[i] > high[i-1] and high[i] > high[i+1] and
+                  high[i+1] > high[i+2] and high[i-1] > high[i-2])
     return resistance
 
-def find_zones(df: pd.DataFrame) -> Tuple[List[Tuple[pd.Timestamp, float]], List[Tuple[pd.Timestamp, float]]]:
-    supply_zones = []
-    demand_zones = []
-    
-    for i in range(2, len(df) - 2):  # Ensure enough data around the current index
-        if isSupport(df, i):
-            demand_zones.append((df.index[i], df['low'][i]))
-        if isResistance(df, i):
-            supply_zones.append((df.index[i], df['high'][i]))
-            
+def pivot_masks(low: np.ndarray, high: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized isSupport/isResistance over whole arrays.
+    Returns boolean (support, resistance) masks; the first and last two bars are always False.
+    """
+    n = len(low)
+    support = np.zeros(n, dtype=bool)
+    resistance = np.zeros(n, dtype=bool)
+    if n < 5:
+        return support, resistance
+
+    # Shifted views: c is bar i, p1/p2 are i-1/i-2, n1/n2 are i+1/i+2
+    c, p1, p2, n1, n2 = slice(2, n - 2), slice(1, n - 3), slice(0, n - 4), slice(3, n - 1), slice(4, n)
+    support[c] = (low[c] < low[p1]) & (low[c] < low[n1]) & (low[n1] < low[n2]) & (low[p1] < low[p2])
+    resistance[c] = (high[c] > high[p1]) & (high[c] > high[n1]) & (high[n1] > high[n2]) & (high[p1] > high[p2])
+    return support, resistance
+
+def find_zones(df: "pd.DataFrame") -> Tuple[List[Tuple["pd.Timestamp", float]], List[Tuple["pd.Timestamp", float]]]:
+    low = df['low'].to_numpy()
+    high = df['high'].to_numpy()
+    support, resistance = pivot_masks(low, high)
+
+    supply_zones = list(zip(df.index[resistance], high[resistance]))
+    demand_zones = list(zip(df.index[support], low[support]))
+
     return supply_zones, demand_zones
+
+def find_zones_in_rates(rates: np.ndarray) -> Tuple[List[Tuple["pd.Timestamp", float]], List[Tuple["pd.Timestamp", float]]]:
+    """
+    find_zones over an MT5 rates array, e.g. a HistoryStore range, without building a DataFrame
+    """
+    import pandas as pd
+    support, resistance = pivot_masks(rates['low'], rates['high'])
+    times = pd.to_datetime(rates['time'], unit='s')
+    supply_zones = list(zip(times[resistance], rates['high'][resistance]))
+    demand_zones = list(zip(times[support], rates['low'][support]))
+    return supply_zones, demand_zones
+
+SUPPLY, DEMAND = "supply", "demand"
+
+class ZoneBand:
+    """Nearby pivots of one kind merged into a price band"""
+    def __init__(self, kind: str, price: float, time: int):
+        self.kind = kind
+        self.low = price
+        self.high = price
+        self.first_time = time
+        self.last_time = time
+        self.pivots = 1
+
+    def absorb(self, other: "ZoneBand") -> None:
+        self.low = min(self.low, other.low)
+        self.high = max(self.high, other.high)
+        self.first_time = min(self.first_time, other.first_time)
+        self.last_time = max(self.last_time, other.last_time)
+        self.pivots += other.pivots
+
+    def __repr__(self):
+        return f"ZoneBand({self.kind}, {self.low}-{self.high}, pivots={self.pivots})"
+
+class ZoneIndex:
+    """
+    Still-valid supply and demand bands, each kind kept sorted by price for bisect lookups.
+    Pivots within `merge_distance` of a band widen it instead of adding a new one, so bands of one
+    kind never overlap and are ordered by both low and high. A supply band is dropped once a bar
+    closes above it and a demand band once a bar closes below it; bands whose newest pivot is older
+    than the lookback are aged out.
+    """
+    def __init__(self, merge_distance: float, touch_distance: float):
+        self.merge_distance = merge_distance
+        self.touch_distance = touch_distance
+        self._bands: Dict[str, List[ZoneBand]] = {SUPPLY: [], DEMAND: []}
+        self._lows: Dict[str, List[float]] = {SUPPLY: [], DEMAND: []}
+        self._oldest = float("inf")  # At or below every band's last_time, so expire() can skip a full pass
+
+    def __len__(self):
+        return len(self._bands[SUPPLY]) + len(self._bands[DEMAND])
+
+    def bands(self, kind: str) -> List[ZoneBand]:
+        """Bands of one kind, lowest first"""
+        return list(self._bands[kind])
+
+    def clear(self) -> None:
+        for kind in (SUPPLY, DEMAND):
+            self._bands[kind].clear()
+            self._lows[kind].clear()
+        self._oldest = float("inf")
+
+    def add(self, kind: str, time: int, price: float) -> ZoneBand:
+        """Insert a confirmed pivot, merging it into a band within merge_distance"""
+        bands, lows = self._bands[kind], self._lows[kind]
+        price = float(price)
+        i = bisect.bisect_right(lows, price)
+        # bands[i - 1] is the last band starting at or below price, bands[i] the first above it
+        for j in (i - 1, i):
+            if 0 <= j < len(bands) and bands[j].low - self.merge_distance <= price <= bands[j].high + self.merge_distance:
+                band = bands[j]
+                band.absorb(ZoneBand(kind, price, time))
+                lows[j] = band.low
+                return self._merge_neighbours(kind, j)
+        band = ZoneBand(kind, price, time)
+        self._oldest = min(self._oldest, time)
+        bands.insert(i, band)
+        lows.insert(i, price)
+        return band
+
+    def _merge_neighbours(self, kind: str, j: int) -> ZoneBand:
+        bands, lows = self._bands[kind], self._lows[kind]
+        while j > 0 and bands[j - 1].high + self.merge_distance >= bands[j].low:
+            bands[j - 1].absorb(bands.pop(j))
+            lows.pop(j)
+            j -= 1
+            lows[j] = bands[j].low
+        while j + 1 < len(bands) and bands[j].high + self.merge_distance >= bands[j + 1].low:
+            bands[j].absorb(bands.pop(j + 1))
+            lows.pop(j + 1)
+        return bands[j]
+
+    def invalidate(self, close: float) -> int:
+        """Drop the bands a bar closing at `close` went through. Returns the number dropped."""
+        supply, demand = self._bands[SUPPLY], self._bands[DEMAND]
+        # Supply bands entirely below the close form a prefix, demand bands entirely above it a suffix
+        broken_supply = bisect.bisect_left(supply, close, key=lambda band: band.high)
+        broken_demand = bisect.bisect_right(self._lows[DEMAND], close)
+        dropped = broken_supply + len(demand) - broken_demand
+        del supply[:broken_supply], self._lows[SUPPLY][:broken_supply]
+        del demand[broken_demand:], self._lows[DEMAND][broken_demand:]
+        return dropped
+
+    def expire(self, cutoff: int) -> int:
+        """Drop bands with no pivot at or after `cutoff` (unix seconds). Returns the number dropped."""
+        # Bands only ever gain newer pivots, so nothing can expire before the oldest last_time seen
+        if self._oldest >= cutoff:
+            return 0
+        dropped = 0
+        oldest = float("inf")
+        for kind in (SUPPLY, DEMAND):
+            keep = [band for band in self._bands[kind] if band.last_time >= cutoff]
+            dropped += len(self._bands[kind]) - len(keep)
+            self._bands[kind] = keep
+            self._lows[kind] = [band.low for band in keep]
+            oldest = min([oldest, *(band.last_time for band in keep)])
+        self._oldest = oldest
+        return dropped
+
+    def nearest_above(self, kind: str, price: float) -> Optional[ZoneBand]:
+        """Closest band containing price or entirely above it"""
+        bands = self._bands[kind]
+        i = bisect.bisect_left(bands, price, key=lambda band: band.high)
+        return bands[i] if i < len(bands) else None
+
+    def nearest_below(self, kind: str, price: float) -> Optional[ZoneBand]:
+        """Closest band containing price or entirely below it"""
+        i = bisect.bisect_right(self._lows[kind], price)
+        return self._bands[kind][i - 1] if i > 0 else None
+
+    def touching(self, kind: str, price: float) -> Optional[ZoneBand]:
+        """The band price is inside of, or within touch_distance of, if any"""
+        above = self.nearest_above(kind, price)
+        if above is not None and above.low - self.touch_distance <= price:
+            return above
+        below = self.nearest_below(kind, price)
+        if below is not None and price <= below.high + self.touch_distance:
+            return below
+        return None
+
+class ZoneTracker:
+    """
+    Incremental find_zones for the live loop.
+    Keeps a rolling buffer of closed bars (MT5 rates array) and the zones found in it.
+    When new bars close only the last few pivot candidates are re-checked.
+    With an `index`, confirmed pivots are also fed into it bar by bar and every close invalidates
+    the bands it went through, so the index always holds the zones still valid at the last close.
+    Zone times are numpy datetime64[s] values rather than pandas Timestamps.
+    """
+    def __init__(self, lookback_seconds: int = 30 * 24 * 3600, index: Optional[ZoneIndex] = None):
+        self.lookback_seconds = lookback_seconds
+        self.index = index
+        self.bars = None
+        self.supply_zones: List[Tuple[np.datetime64, float]] = []
+        self.demand_zones: List[Tuple[np.datetime64, float]] = []
+
+    @property
+    def last_time(self):
+        if self.bars is None or len(self.bars) == 0:
+            return None
+        return int(self.bars['time'][-1])
+
+    def covers(self, rates: np.ndarray) -> bool:
+        """True if rates continue the buffer without a gap, so update() can be used instead of seed()"""
+        return self.last_time is not None and len(rates) > 0 and int(rates['time'][0]) <= self.last_time
+
+    def seed(self, rates: np.ndarray) -> None:
+        """Reset from a full history; the last bar in rates is treated as still forming"""
+        self.bars = rates[:-1].copy()
+        self.supply_zones = []
+        self.demand_zones = []
+        if self.index is not None:
+            self.index.clear()
+        self._trim()
+        self._scan(2, 0)
+
+    def update(self, rates: np.ndarray) -> bool:
+        """
+        Merge the latest rates (newest bar last, still forming).
+        Returns True if at least one bar closed and the zones were re-checked.
+        """
+        if self.last_time is None:
+            self.seed(rates)
+            return True
+
+        closed = rates[:-1]
+        new_bars = closed[closed['time'] > self.last_time]
+        if len(new_bars) == 0:
+            return False
+
+        old_len = len(self.bars)
+        self.bars = np.concatenate([self.bars, new_bars])
+        # Candidates up to old_len - 3 were already confirmed by their two right-hand neighbours
+        dropped = self._trim()
+        start = old_len - 2 - dropped
+        self._scan(max(2, start), max(0, old_len - dropped))
+        return True
+
+    def _trim(self) -> int:
+        """Drop bars older than the lookback window and the zones that fell out with them"""
+        if len(self.bars) == 0:
+            return 0
+        cutoff = self.bars['time'][-1] - self.lookback_seconds
+        dropped = int(np.searchsorted(self.bars['time'], cutoff, side='left'))
+        if dropped:
+            self.bars = self.bars[dropped:]
+            # find_zones never reports the first two bars of a window
+            first_valid = np.datetime64(int(self.bars['time'][min(2, len(self.bars) - 1)]), 's')
+            self.supply_zones = [z for z in self.supply_zones if z[0] >= first_valid]
+            self.demand_zones = [z for z in self.demand_zones if z[0] >= first_valid]
+        return dropped
+
+    def _scan(self, start: int, first_new: int) -> None:
+        """Collect pivots from bar `start` on; bars from `first_new` on have not been seen by the index"""
+        offset = start - 2
+        window = self.bars[offset:]
+        support, resistance = pivot_masks(window['low'], window['high'])
+        times = window['time'].astype('datetime64[s]')
+        self.supply_zones.extend(zip(times[resistance], window['high'][resistance]))
+        self.demand_zones.extend(zip(times[support], window['low'][support]))
+        if self.index is None or len(self.bars) == 0:
+            return
+
+        # Replay the new closes in order: a pivot at bar i joins the index once bar i + 2 has
+        # closed, and each close then breaks the bands it went through
+        bar_times = self.bars['time']
+        highs, lows, closes = self.bars['high'], self.bars['low'], self.bars['close']
+        for j in range(first_new, len(self.bars)):
+            local = j - 2 - offset
+            if 0 <= local < len(window):
+                if resistance[local]:
+                    self.index.add(SUPPLY, int(bar_times[j - 2]), highs[j - 2])
+                if support[local]:
+                    self.index.add(DEMAND, int(bar_times[j - 2]), lows[j - 2])
+            self.index.invalidate(float(closes[j]))
+        self.index.expire(int(bar_times[-1]) - self.lookback_seconds)
+
+def seed_tracker(rates: np.ndarray, lookback_seconds: int, index: Optional[ZoneIndex] = None) -> ZoneTracker:
+    """Build a seeded ZoneTracker; module-level so a process pool can run it"""
+    tracker = ZoneTracker(lookback_seconds, index)
+    tracker.seed(rates)
+    return tracker